@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# Barcarolle_Benchmark.py
+
+"""
+Run the benchmark like:
+--------------------------
+Stubbed probes (no ffmpeg needed) over a synthetic tree of 6 x 6 x 6 directories with 50 files each (~13k files):
+python Barcarolle_Benchmark.py -depth 3 -fanout 6 -files 50 -mode stub
+
+Real clips generated with the local ffmpeg binary and hard-linked through the tree:
+python Barcarolle_Benchmark.py -depth 2 -fanout 4 -files 20 -mode real -jobs 8
+
+Compare against an earlier run:
+python Barcarolle_Benchmark.py -mode stub -compare benchmark_results/20240101120000-abc1234.json
+
+Parameters Table:
+--------------------
+| Flag      | Input Type | Default            | Description                                                             |
+|-----------|------------|--------------------|-------------------------------------------------------------------------|
+| -root     | str        | temp directory     | Where to build the synthetic tree (removed afterwards unless -keep).     |
+| -depth    | int        | 2                  | Directory levels below the root.                                        |
+| -fanout   | int        | 4                  | Subdirectories per directory.                                           |
+| -files    | int        | 25                 | Video files per directory (plus one non-video file).                    |
+| -mode     | str        | stub               | 'stub' (empty files, synthetic probe results) or 'real' (tiny clips).   |
+| -jobs     | int        | CPU count          | Probe concurrency passed to the scanner.                                |
+| -entries  | int        | 200000             | Entries written by the playlist-writing benchmark.                      |
+| -output   | str        | benchmark_results  | Directory the JSON result is written to.                                |
+| -compare  | str        | -                  | Earlier JSON result to compare against.                                 |
+| -keep     | flag       | False              | Keep the synthetic tree and outputs.                                    |
+
+Timed stages: tree build, scan_directory (cold and warm probe cache), validate_length, the columnar library
+(build, then several filter queries; only when NumPy is installed), write_playlist (plain and shuffled),
+create_7z_archive (every preset) and the Manato cascade end to end.
+Results are written as JSON tagged with the current git commit so runs can be compared across commits.
+"""
+
+import os
+import argparse
+import contextlib
+import hashlib
+import importlib.util
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import yaml
+
+import Barcarolle_Playlist_Generator as barcarolle
+
+# Filter combinations answered from one columnar library by the 'library_query' stage
+LIBRARY_QUERIES = [{}, {'min_length': 60, 'max_length': 300}, {'portrait': True}, {'horz': True, 'min_aspect': 1.5},
+                   {'resolution': ['fhd', 'uhd']}, {'min_size': 0.0001}, {'modified_since': '2000-01-01'}]
+
+# (width, height, seconds) of the clips 'real' mode generates and links through the tree
+REAL_CLIPS = [(160, 90, 2), (90, 160, 3), (320, 180, 5), (180, 320, 1)]
+CLIP_EXTENSIONS = ['mp4', 'mkv', 'mov', 'webm']
+
+def stub_media_info(full_path, **probe_options):
+    # Deterministic per path, so cold and warm runs accept the same files
+    seed = int.from_bytes(hashlib.md5(full_path.encode('utf-8', 'surrogateescape')).digest()[:4], 'big')
+    width, height = (1920, 1080) if seed % 3 else (1080, 1920)
+    return barcarolle.MediaInfo(duration=float(5 + seed % 600), width=width, height=height,
+                                rotation=0, codec='h264', has_video=True)
+
+@contextlib.contextmanager
+def stubbed_probes(enabled):
+    if not enabled:
+        yield
+        return
+    originals = barcarolle.run_probe, barcarolle.run_lean_probe, barcarolle.run_header_probe
+    barcarolle.run_probe = barcarolle.run_lean_probe = barcarolle.run_header_probe = stub_media_info
+    try:
+        yield
+    finally:
+        barcarolle.run_probe, barcarolle.run_lean_probe, barcarolle.run_header_probe = originals
+
+@contextlib.contextmanager
+def quiet():
+    # The scanner reports every skipped file; keep that out of the benchmark output
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+def timed(results, name, items, function, *args, **kwargs):
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    with quiet():
+        value = function(*args, **kwargs)
+    wall, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+    results[name] = {'seconds': round(wall, 6), 'cpu_seconds': round(cpu, 6), 'items': items,
+                     'items_per_second': round(items / wall, 2) if wall > 0 else None}
+    print(f"{name:<28} {wall:>10.3f} s {items:>10} items {results[name]['items_per_second'] or 0:>12.1f} /s")
+    return value
+
+def make_real_clips(clip_dir):
+    ffmpeg_binary = shutil.which('ffmpeg')
+    if ffmpeg_binary is None:
+        print("'-mode real' needs the ffmpeg binary on PATH.")
+        sys.exit(1)
+    clips = []
+    for index, (width, height, seconds) in enumerate(REAL_CLIPS):
+        ext = CLIP_EXTENSIONS[index % len(CLIP_EXTENSIONS)]
+        clip = os.path.join(clip_dir, f"clip{index}.{ext}")
+        subprocess.run([ffmpeg_binary, '-loglevel', 'error', '-y', '-f', 'lavfi',
+                        '-i', f'testsrc=size={width}x{height}:rate=5', '-t', str(seconds), clip], check=True)
+        clips.append(clip)
+    return clips
+
+def build_tree(root, depth, fanout, files_per_dir, clips=None):
+    """Create fanout**level directories per level down to 'depth', each holding files_per_dir videos."""
+    count = 0
+    level = [root]
+    for current_depth in range(depth + 1):
+        next_level = []
+        for directory in level:
+            os.makedirs(directory, exist_ok=True)
+            for index in range(files_per_dir):
+                if clips:
+                    source = clips[(count + index) % len(clips)]
+                    target = os.path.join(directory, f"video{index}.{source.rsplit('.', 1)[-1]}")
+                    try:
+                        os.link(source, target)
+                    except OSError:
+                        shutil.copyfile(source, target)
+                else:
+                    ext = CLIP_EXTENSIONS[index % len(CLIP_EXTENSIONS)]
+                    open(os.path.join(directory, f"video{index}.{ext}"), 'w').close()
+            open(os.path.join(directory, 'notes.txt'), 'w').close()
+            count += files_per_dir
+            if current_depth < depth:
+                next_level.extend(os.path.join(directory, f"d{index}") for index in range(fanout))
+        level = next_level
+
+def scan_args(tree, output, jobs, cache_mode):
+    return argparse.Namespace(dir=tree, mount='/client/media', output=output, jobs=jobs, header_probe='yes',
+                              cache=os.path.join(output, barcarolle.PROBE_CACHE_FILENAME), cache_mode=cache_mode,
+                              cache_max_entries=None, cache_max_age=None, min_length=30, max_length=None,
+                              portrait=False, horz=False, shuffle='no')
+
+def run_library_queries(library_args):
+    for query in LIBRARY_QUERIES:
+        query_args = argparse.Namespace(**{**vars(library_args), 'min_length': None, **query})
+        list(barcarolle.iter_library_relative(query_args))
+
+def run_manato(workdir, tree, jobs):
+    import Manato_Cascading_Folder_Playlist_Generator as manato
+    config_file = os.path.join(workdir, 'manato.yaml')
+    with open(config_file, 'w') as f:
+        yaml.dump({'dirs': [tree], 'output_dir': os.path.join(workdir, 'manato-output'),
+                   'os_types': ['linux', 'macos', 'win'],
+                   'os_mounts': ['/linux/media', '/macos/media', 'Z:\\media'],
+                   'min_length': 30, 'jobs': jobs, 'cache_mode': 'off', 'zip_output': 'yes'}, f)
+    manato.main(config_file)
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def compare(results, baseline_file):
+    with open(baseline_file, 'r') as f:
+        baseline = json.load(f)
+    print(f"\nCompared with {baseline_file} (commit {baseline.get('commit')}):")
+    print("{:<28} {:>12} {:>12} {:>9}".format("Stage", "Before (s)", "Now (s)", "Ratio"))
+    for name, result in results.items():
+        before = baseline.get('results', {}).get(name)
+        if not before or not before.get('seconds'):
+            continue
+        ratio = result['seconds'] / before['seconds']
+        print("{:<28} {:>12.3f} {:>12.3f} {:>8.2f}x".format(name, before['seconds'], result['seconds'], ratio))
+
+def main(args):
+    workdir = args.root or tempfile.mkdtemp(prefix='barcarolle-bench-')
+    tree = os.path.join(workdir, 'library')
+    output = os.path.join(workdir, 'output')
+    os.makedirs(output, exist_ok=True)
+    stub = args.mode == 'stub'
+    results = {}
+
+    try:
+        clips = None if stub else make_real_clips(workdir)
+        file_count = args.files * sum(args.fanout ** level for level in range(args.depth + 1))
+        timed(results, 'build_tree', file_count, build_tree, tree, args.depth, args.fanout, args.files, clips)
+
+        with stubbed_probes(stub):
+            playlist = timed(results, 'scan_directory_cold', file_count, barcarolle.scan_directory,
+                             scan_args(tree, output, args.jobs, 'rebuild'))
+            timed(results, 'scan_directory_warm', file_count, barcarolle.scan_directory,
+                  scan_args(tree, output, args.jobs, 'use'))
+            timed(results, 'scan_directory_nocache', file_count, barcarolle.scan_directory,
+                  scan_args(tree, output, args.jobs, 'off'))
+
+            sample = [os.path.join(root, name) for root, _, names in os.walk(tree) for name in names
+                      if not name.endswith('.txt')][:1000]
+            length_args = scan_args(tree, output, 1, 'off')
+            timed(results, 'validate_length', len(sample),
+                  lambda: [barcarolle.validate_length(length_args, full_path) for full_path in sample])
+
+            # The columnar library is optional (NumPy); skip its stages when NumPy is not installed
+            if importlib.util.find_spec('numpy') is not None:
+                library_args = scan_args(tree, output, args.jobs, 'use')
+                library_args.library = os.path.join(output, 'library')
+                timed(results, 'library_build', file_count, barcarolle.open_library, library_args)
+                timed(results, 'library_query', len(LIBRARY_QUERIES), run_library_queries, library_args)
+
+            entries = [f"/client/media/d{index % 97}/d{index % 13}/video{index}.mp4" for index in range(args.entries)]
+            playlist_file = os.path.join(output, 'bench.m3u8')
+            timed(results, 'write_playlist', len(entries), barcarolle.write_playlist, playlist_file, iter(entries))
+            timed(results, 'write_playlist_shuffled', len(entries), barcarolle.write_playlist, playlist_file,
+                  iter(entries), shuffle=True)
+
+            for preset in barcarolle.ARCHIVE_PRESETS:
+                archive = os.path.join(output, f"bench-{preset}.7z")
+                timed(results, f"create_7z_archive_{preset}", len(entries), barcarolle.create_7z_archive,
+                      output, archive, preset)
+                results[f"create_7z_archive_{preset}"]['bytes'] = os.path.getsize(archive)
+                os.remove(archive)
+                os.remove(barcarolle.archive_state_path(archive))
+
+            timed(results, 'manato_cascade', file_count, run_manato, workdir, tree, args.jobs)
+    finally:
+        if not args.keep and not args.root:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'params': {'mode': args.mode, 'depth': args.depth, 'fanout': args.fanout, 'files': args.files,
+                   'jobs': args.jobs, 'entries': args.entries, 'accepted': len(playlist)},
+        'results': results,
+    }
+    os.makedirs(args.output, exist_ok=True)
+    result_file = os.path.join(args.output, f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{report['commit']}.json")
+    with open(result_file, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nBenchmark results written to: {result_file}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark Barcarolle scanning, probing, writing and archiving on a synthetic media tree.")
+    parser.add_argument('-root', help="Where to build the synthetic tree (default: a temp directory, removed afterwards).")
+    parser.add_argument('-depth', type=int, default=2, help="Directory levels below the root.")
+    parser.add_argument('-fanout', type=int, default=4, help="Subdirectories per directory.")
+    parser.add_argument('-files', type=int, default=25, help="Video files per directory.")
+    parser.add_argument('-mode', default='stub', choices=['stub', 'real'], help="'stub' probes or 'real' ffmpeg-generated clips.")
+    parser.add_argument('-jobs', type=int, default=os.cpu_count() or 1, help="Probe concurrency passed to the scanner.")
+    parser.add_argument('-entries', type=int, default=200000, help="Entries written by the playlist-writing benchmark.")
+    parser.add_argument('-output', default='benchmark_results', help="Directory the JSON result is written to.")
+    parser.add_argument('-compare', help="Earlier JSON result to compare against.")
+    parser.add_argument('-keep', action='store_true', help="Keep the synthetic tree and outputs.")
+    main(parser.parse_args())
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# Barcarolle_Cache.py
+
+"""
+The SQLite plumbing shared by Barcarolle's persistent per-file caches: ffprobe results ('ProbeCache' in
+Barcarolle_Playlist_Generator.py) and content digests ('HashCache' in Barcarolle_Dedupe.py).
+
+Each cache is one table, normally in the same file, keyed by path and holding the file's size and mtime;
+a row is only returned while both still match. The file is opened in WAL mode, and writes and last-seen
+updates are buffered and flushed in one short transaction every 'COMMIT_EVERY' changes, so several
+processes can share it without holding its write lock while they work. On close, rows not seen for
+'max_age_days', and the least recently seen beyond 'max_entries', are evicted.
+"""
+
+import os
+import sqlite3
+import time
+
+class SQLiteCache:
+    """
+    Base of the per-file caches. Subclasses name their 'TABLE' and declare the 'COLUMNS' stored between
+    (path, size, mtime_ns) and last_seen, then read and write them with '_lookup' and '_store'.
+    """
+    TABLE = None
+    COLUMNS = None
+    COMMIT_EVERY = 500
+    BUSY_TIMEOUT = 60
+
+    def __init__(self, db_path, max_entries=None, max_age_days=None, rebuild=False):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self._writes = []
+        self._touched = []
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, timeout=self.BUSY_TIMEOUT)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self._prepare(rebuild)
+        self.conn.commit()
+
+    def _prepare(self, rebuild):
+        # Overridden to drop the table for other reasons too (ProbeCache's schema version)
+        if rebuild:
+            self.conn.execute(f'DROP TABLE IF EXISTS {self.TABLE}')
+        self.conn.execute(f'''CREATE TABLE IF NOT EXISTS {self.TABLE} (
+            path TEXT PRIMARY KEY,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            {self.COLUMNS},
+            last_seen REAL NOT NULL)''')
+        self.conn.execute(f'CREATE INDEX IF NOT EXISTS {self.TABLE}_last_seen ON {self.TABLE} (last_seen)')
+
+    def _lookup(self, path, stat, columns):
+        """The named columns of path's row while its size and mtime match stat, or None."""
+        row = self.conn.execute(f'SELECT size, mtime_ns, {columns} FROM {self.TABLE} WHERE path = ?', (path,)).fetchone()
+        if row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touched.append((time.time(), path))
+        self._tick()
+        return row[2:]
+
+    def _store(self, path, stat, *values):
+        # values in the order of COLUMNS
+        self._writes.append((path, stat.st_size, stat.st_mtime_ns, *values, time.time()))
+        self._tick()
+
+    def _tick(self):
+        if len(self._writes) + len(self._touched) >= self.COMMIT_EVERY:
+            self.flush()
+
+    def flush(self):
+        with self.conn:
+            if self._writes:
+                placeholders = ', '.join('?' * len(self._writes[0]))
+                self.conn.executemany(f'INSERT OR REPLACE INTO {self.TABLE} VALUES ({placeholders})', self._writes)
+            self.conn.executemany(f'UPDATE {self.TABLE} SET last_seen = ? WHERE path = ?', self._touched)
+        self._writes = []
+        self._touched = []
+
+    def evict(self):
+        if self.max_age_days:
+            cutoff = time.time() - self.max_age_days * 86400
+            self.conn.execute(f'DELETE FROM {self.TABLE} WHERE last_seen < ?', (cutoff,))
+        if self.max_entries:
+            count = self.conn.execute(f'SELECT COUNT(*) FROM {self.TABLE}').fetchone()[0]
+            if count > self.max_entries:
+                self.conn.execute(f'DELETE FROM {self.TABLE} WHERE path IN '
+                                  f'(SELECT path FROM {self.TABLE} ORDER BY last_seen ASC LIMIT ?)',
+                                  (count - self.max_entries,))
+        self.conn.commit()
+
+    def clear(self):
+        # What '-cache_mode rebuild' does to a cache that stays open (Barcarolle_Daemon's)
+        self._writes = []
+        self._touched = []
+        with self.conn:
+            self.conn.execute(f'DELETE FROM {self.TABLE}')
+
+    def close(self):
+        self.flush()
+        self.evict()
+        self.conn.close()
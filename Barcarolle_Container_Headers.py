@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# Barcarolle_Container_Headers.py
+
+"""
+In-process header reader for the containers that make up most libraries, so Barcarolle can skip
+spawning ffprobe for them.
+
+- ISO base media files (mp4, m4v, mov, ...): 'moov/mvhd' gives the duration, the first 'trak' whose
+  'mdia/hdlr' is 'vide' gives the codec and frame size ('stsd' sample entry, falling back to 'tkhd')
+  and the rotation ('tkhd' matrix).
+- Matroska / WebM (mkv, webm): 'Segment/Info' gives TimecodeScale and Duration, the first video
+  'Segment/Tracks/TrackEntry' gives CodecID and PixelWidth/PixelHeight.
+
+Only box/element headers and the few small payloads above are read, with seeks over everything else
+(including 'mdat' and Clusters), so a file costs a few KB of I/O regardless of its size.
+'read_container_info' returns None whenever a file cannot be fully understood (unknown extension,
+fragmented or truncated file, missing duration, no video track); callers then fall back to ffprobe.
+"""
+
+import math
+import os
+import struct
+
+# Larger payloads than this mean the file is not what we expect; let ffprobe deal with it
+MAX_ELEMENT_BYTES = 1 << 20
+MAX_BOXES = 256
+
+MP4_EXTENSIONS = {'mp4', 'm4v', 'mov', 'qt', 'm4p', '3gp', '3g2', 'f4v'}
+MATROSKA_EXTENSIONS = {'mkv', 'webm'}
+
+MP4_CODECS = {'avc1': 'h264', 'avc3': 'h264', 'hvc1': 'hevc', 'hev1': 'hevc', 'vp09': 'vp9', 'av01': 'av1',
+              'mp4v': 'mpeg4', 'jpeg': 'mjpeg', 'apch': 'prores', 'apcn': 'prores', 'apcs': 'prores',
+              'apco': 'prores', 'ap4h': 'prores'}
+MATROSKA_CODECS = {'V_MPEG4/ISO/AVC': 'h264', 'V_MPEGH/ISO/HEVC': 'hevc', 'V_VP8': 'vp8', 'V_VP9': 'vp9',
+                   'V_AV1': 'av1', 'V_MPEG4/ISO/ASP': 'mpeg4', 'V_MPEG2': 'mpeg2video', 'V_THEORA': 'theora'}
+
+
+class HeaderError(Exception):
+    pass
+
+
+def read_container_info(full_path):
+    """Return (duration, width, height, rotation, codec) from the container header, or None."""
+    ext = full_path.rsplit('.', 1)[-1].lower()
+    if ext in MP4_EXTENSIONS:
+        parse = parse_mp4
+    elif ext in MATROSKA_EXTENSIONS:
+        parse = parse_matroska
+    else:
+        return None
+    try:
+        with open(full_path, 'rb') as f:
+            info = parse(f, os.fstat(f.fileno()).st_size)
+    except (OSError, HeaderError, struct.error, UnicodeDecodeError, IndexError):
+        return None
+    if info is None:
+        return None
+    duration, width, height, rotation, codec = info
+    if not duration or duration <= 0 or not width or not height:
+        return None
+    return info
+
+
+def read_exact(f, size):
+    if size > MAX_ELEMENT_BYTES:
+        raise HeaderError(f"element of {size} bytes is larger than expected")
+    data = f.read(size)
+    if len(data) != size:
+        raise HeaderError("unexpected end of file")
+    return data
+
+
+# ---------------------------------------------------------------------------------------------
+# ISO base media (mp4/mov)
+# ---------------------------------------------------------------------------------------------
+
+def iter_boxes(f, start, end):
+    """Yield (type, payload_offset, payload_size) for the boxes between start and end."""
+    offset = start
+    for _ in range(MAX_BOXES):
+        if offset + 8 > end:
+            return
+        f.seek(offset)
+        size, box_type = struct.unpack('>I4s', read_exact(f, 8))
+        header = 8
+        if size == 1:
+            size = struct.unpack('>Q', read_exact(f, 8))[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header or offset + size > end:
+            raise HeaderError("box overruns its parent")
+        yield box_type.decode('latin-1'), offset + header, size - header
+        offset += size
+
+
+def find_box(f, start, end, wanted):
+    for box_type, payload, size in iter_boxes(f, start, end):
+        if box_type == wanted:
+            return payload, size
+    return None
+
+
+def parse_mp4(f, file_size):
+    moov = find_box(f, 0, file_size, 'moov')
+    if moov is None:
+        return None
+    moov_start, moov_size = moov
+    moov_end = moov_start + moov_size
+
+    duration = None
+    video_track = None
+    for box_type, payload, size in iter_boxes(f, moov_start, moov_end):
+        if box_type == 'mvhd':
+            duration = parse_mvhd(f, payload, size)
+        elif box_type == 'trak' and video_track is None:
+            video_track = parse_trak(f, payload, payload + size)
+    if duration is None or video_track is None:
+        return None
+    width, height, rotation, codec = video_track
+    return duration, width, height, rotation, codec
+
+
+def parse_mvhd(f, payload, size):
+    f.seek(payload)
+    data = read_exact(f, min(size, 32))
+    if len(data) < (32 if data[:1] == b'\x01' else 20):
+        raise HeaderError("mvhd box is truncated")
+    if data[0] == 1:
+        timescale, duration = struct.unpack('>IQ', data[20:32])
+    else:
+        timescale, duration = struct.unpack('>II', data[12:20])
+    if not timescale:
+        return None
+    return duration / timescale
+
+
+def parse_trak(f, start, end):
+    tkhd = mdia = None
+    for box_type, payload, size in iter_boxes(f, start, end):
+        if box_type == 'tkhd':
+            tkhd = (payload, size)
+        elif box_type == 'mdia':
+            mdia = (payload, size)
+    if tkhd is None or mdia is None:
+        return None
+
+    mdia_end = mdia[0] + mdia[1]
+    hdlr = find_box(f, mdia[0], mdia_end, 'hdlr')
+    if hdlr is None:
+        return None
+    f.seek(hdlr[0] + 8)
+    if read_exact(f, 4) != b'vide':
+        return None
+
+    track_width, track_height, rotation = parse_tkhd(f, *tkhd)
+    codec, width, height = None, None, None
+    minf = find_box(f, mdia[0], mdia_end, 'minf')
+    stbl = minf and find_box(f, minf[0], minf[0] + minf[1], 'stbl')
+    stsd = stbl and find_box(f, stbl[0], stbl[0] + stbl[1], 'stsd')
+    if stsd and stsd[1] >= 44:
+        f.seek(stsd[0])
+        entry = read_exact(f, 44)[8:]
+        fourcc = entry[4:8].decode('latin-1')
+        codec = MP4_CODECS.get(fourcc, fourcc.strip().lower())
+        width, height = struct.unpack('>HH', entry[32:36])
+    return width or track_width, height or track_height, rotation, codec
+
+
+def parse_tkhd(f, payload, size):
+    f.seek(payload)
+    data = read_exact(f, min(size, 96))
+    if len(data) < (96 if data[:1] == b'\x01' else 84):
+        raise HeaderError("tkhd box is truncated")
+    # Skip the version-dependent timestamps, track id and duration
+    body = data[36:] if data[0] == 1 else data[24:]
+    # reserved(8) layer(2) alternate_group(2) volume(2) reserved(2), then the matrix and the 16.16 size
+    matrix = struct.unpack('>9i', body[16:52])
+    width, height = struct.unpack('>II', body[52:60])
+    a, b = matrix[0] / 65536.0, matrix[1] / 65536.0
+    rotation = int(round(math.degrees(math.atan2(b, a)))) % 360
+    return width >> 16, height >> 16, rotation
+
+
+# ---------------------------------------------------------------------------------------------
+# Matroska / WebM (EBML)
+# ---------------------------------------------------------------------------------------------
+
+EBML_HEADER = 0x1A45DFA3
+SEGMENT = 0x18538067
+INFO = 0x1549A966
+TRACKS = 0x1654AE6B
+CLUSTER = 0x1F43B675
+TIMECODE_SCALE = 0x2AD7B1
+DURATION = 0x4489
+TRACK_ENTRY = 0xAE
+TRACK_TYPE = 0x83
+CODEC_ID = 0x86
+VIDEO = 0xE0
+PIXEL_WIDTH = 0xB0
+PIXEL_HEIGHT = 0xBA
+UNKNOWN_SIZE = -1
+
+
+def read_vint(data, offset, keep_marker):
+    if offset >= len(data):
+        raise HeaderError("truncated EBML variable-length integer")
+    first = data[offset]
+    if first == 0:
+        raise HeaderError("invalid EBML variable-length integer")
+    length = 8 - first.bit_length() + 1
+    if len(data) < offset + length:
+        raise HeaderError("truncated EBML variable-length integer")
+    value = first if keep_marker else first & (0xFF >> length)
+    for byte in data[offset + 1:offset + length]:
+        value = (value << 8) | byte
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        value = UNKNOWN_SIZE
+    return value, offset + length
+
+
+def read_element_header(f, offset):
+    """Return (id, size, header_size) of the element starting at offset, or None at end of file."""
+    f.seek(offset)
+    head = f.read(12)
+    if len(head) < 2:
+        return None
+    element_id, header_size = read_vint(head, 0, keep_marker=True)
+    size, header_size = read_vint(head, header_size, keep_marker=False)
+    return element_id, size, header_size
+
+
+def iter_elements(data):
+    offset = 0
+    while offset < len(data):
+        element_id, offset = read_vint(data, offset, keep_marker=True)
+        size, offset = read_vint(data, offset, keep_marker=False)
+        if size == UNKNOWN_SIZE or offset + size > len(data):
+            raise HeaderError("element overruns its parent")
+        yield element_id, data[offset:offset + size]
+        offset += size
+
+
+def ebml_uint(data):
+    return int.from_bytes(data, 'big')
+
+
+def ebml_float(data):
+    if len(data) == 4:
+        return struct.unpack('>f', data)[0]
+    if len(data) == 8:
+        return struct.unpack('>d', data)[0]
+    return None
+
+
+def parse_matroska(f, file_size):
+    header = read_element_header(f, 0)
+    if header is None or header[0] != EBML_HEADER or header[1] == UNKNOWN_SIZE:
+        return None
+    segment_offset = header[2] + header[1]
+
+    header = read_element_header(f, segment_offset)
+    if header is None or header[0] != SEGMENT:
+        return None
+    offset = segment_offset + header[2]
+    segment_end = file_size if header[1] == UNKNOWN_SIZE else min(file_size, offset + header[1])
+
+    info = tracks = None
+    for _ in range(MAX_BOXES):
+        if offset >= segment_end or (info is not None and tracks is not None):
+            break
+        header = read_element_header(f, offset)
+        if header is None:
+            break
+        element_id, size, header_size = header
+        if element_id == CLUSTER or size == UNKNOWN_SIZE:
+            break
+        if element_id in (INFO, TRACKS):
+            f.seek(offset + header_size)
+            payload = read_exact(f, size)
+            if element_id == INFO:
+                info = parse_matroska_info(payload)
+            else:
+                tracks = parse_matroska_tracks(payload)
+        offset += header_size + size
+
+    if info is None or tracks is None:
+        return None
+    width, height, codec = tracks
+    return info, width, height, 0, codec
+
+
+def parse_matroska_info(payload):
+    timecode_scale, duration = 1000000, None
+    for element_id, data in iter_elements(payload):
+        if element_id == TIMECODE_SCALE:
+            timecode_scale = ebml_uint(data)
+        elif element_id == DURATION:
+            duration = ebml_float(data)
+    if duration is None:
+        return None
+    return duration * timecode_scale / 1e9
+
+
+def parse_matroska_tracks(payload):
+    for element_id, entry in iter_elements(payload):
+        if element_id != TRACK_ENTRY:
+            continue
+        track_type, codec_id, width, height = None, None, None, None
+        for child_id, data in iter_elements(entry):
+            if child_id == TRACK_TYPE:
+                track_type = ebml_uint(data)
+            elif child_id == CODEC_ID:
+                codec_id = data.rstrip(b'\0').decode('ascii')
+            elif child_id == VIDEO:
+                for video_id, value in iter_elements(data):
+                    if video_id == PIXEL_WIDTH:
+                        width = ebml_uint(value)
+                    elif video_id == PIXEL_HEIGHT:
+                        height = ebml_uint(value)
+        if track_type == 1:
+            return width, height, MATROSKA_CODECS.get(codec_id, (codec_id or '').lower() or None)
+    return None
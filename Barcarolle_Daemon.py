@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# Barcarolle_Daemon.py
+
+"""
+Run the daemon like:
+--------------------------
+python3 Barcarolle_Daemon.py -socket /tmp/barcarolle.sock -cache /var/cache/barcarolle.sqlite -library /var/cache/barcarolle-library
+
+Then send it any Barcarolle command by adding -server:
+python3 Barcarolle_Playlist_Generator.py -server /tmp/barcarolle.sock -dir /media -mount /client/media -output /playlists -sample 500
+
+Parameters Table:
+--------------------
+| Flag            | Input Type | Default                      | Description                                                        |
+|-----------------|------------|------------------------------|--------------------------------------------------------------------|
+| -socket         | str        | /tmp/barcarolle.sock         | Unix socket to listen on (replaced if stale, mode 0600).           |
+| -cache          | str        | ~/.cache/barcarolle.sqlite   | Persistent probe cache behind the in-memory one.                   |
+| -library        | str        | -                            | Columnar library(ies) whose rows pre-load the in-memory cache.     |
+| -memory_entries | int        | 200000                       | Most probe results kept in memory (least recently used evicted).   |
+| -warm_entries   | int        | 100000                       | Most recently seen rows of -cache loaded into memory at start.     |
+
+The daemon imports Barcarolle once and keeps every probe result it sees in an in-memory LRU in front of the SQLite
+probe cache, so repeat requests for unchanged files neither run ffprobe nor touch SQLite. Entries are only used while
+the file's size and mtime still match. Requests are newline-delimited JSON over the socket: {"argv": [...], "cwd": "..."}
+with the same arguments as Barcarolle_Playlist_Generator.py, answered with {"status": ..., "output": "...", "seconds": ...}.
+{"command": "ping"} and {"command": "shutdown"} are also understood. Requests are served one at a time, in order.
+Every request uses the daemon's cache file, for probe results and '-dedupe' digests alike, so a request's '-cache' is
+ignored. '-cache_mode off' bypasses it for that request, and '-cache_mode rebuild' empties it (memory and SQLite) first.
+A Unix socket, not HTTP: it needs no port and file permissions decide who may send requests.
+"""
+
+import os
+import argparse
+import contextlib
+import io
+import json
+import socket
+import socketserver
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_SOCKET = '/tmp/barcarolle.sock'
+DEFAULT_CACHE = os.path.join(os.path.expanduser('~'), '.cache', 'barcarolle.sqlite')
+
+class MemoryProbeCache:
+    """
+    LRU of probe results in front of a ProbeCache, with the same get/put/close/hits interface, keyed by absolute path
+    and only returned while the file's size and mtime still match. Misses fall through to the persistent cache.
+    """
+
+    def __init__(self, store, max_entries=200000):
+        self.store = store
+        self.db_path = store.db_path
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # path: (size, mtime_ns or None, mtime or None, MediaInfo)
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, path, size, mtime_ns, mtime, info):
+        self.entries[path] = (size, mtime_ns, mtime, info)
+        self.entries.move_to_end(path)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def get(self, path, stat):
+        key = os.path.abspath(path)
+        entry = self.entries.get(key)
+        if entry is not None:
+            size, mtime_ns, mtime, info = entry
+            # Rows from a library only know the float mtime; rows from SQLite know the exact nanoseconds
+            fresh = mtime == stat.st_mtime if mtime_ns is None else mtime_ns == stat.st_mtime_ns
+            if size == stat.st_size and fresh:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return info
+            del self.entries[key]
+        info = self.store.get(path, stat)
+        if info is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._remember(key, stat.st_size, stat.st_mtime_ns, None, info)
+        return info
+
+    def put(self, path, stat, info):
+        self._remember(os.path.abspath(path), stat.st_size, stat.st_mtime_ns, None, info)
+        self.store.put(path, stat, info)
+
+    def clear(self):
+        self.entries.clear()
+        self.store.clear()
+
+    def close(self):
+        # Called after every scan; the persistent cache stays open for the next request
+        self.store.flush()
+
+    def reset_counters(self):
+        self.hits = 0
+        self.misses = 0
+
+    def shutdown(self):
+        self.store.close()
+
+    def warm_from_cache(self, limit):
+        """Load the 'limit' most recently seen entries of the persistent cache. Returns how many."""
+        from Barcarolle_Playlist_Generator import MediaInfo
+        rows = self.store.conn.execute('SELECT path, size, mtime_ns, duration, width, height, rotation, codec, has_video '
+                                       'FROM probes ORDER BY last_seen DESC LIMIT ?', (limit,)).fetchall()
+        # Oldest first, so the most recently seen end up as the most recently used
+        for path, size, mtime_ns, duration, width, height, rotation, codec, has_video in reversed(rows):
+            self._remember(os.path.abspath(path), size, mtime_ns, None,
+                           MediaInfo(duration, width, height, rotation, codec, bool(has_video)))
+        return len(rows)
+
+    def warm_from_library(self, library):
+        """Load every row of a MediaLibrary (paths are resolved against its root). Returns how many."""
+        from Barcarolle_Playlist_Generator import MediaInfo
+        for index in range(len(library)):
+            row = library.row(index)
+            size, mtime = row.pop('size'), row.pop('mtime')
+            full_path = os.path.join(library.root, *library.path(index).split('/'))
+            self._remember(full_path, size, None, mtime, MediaInfo(has_video=True, codec=None, **row))
+        return len(library)
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                request = {}
+                response = {'status': 2, 'output': f"Invalid request: {e}\n", 'seconds': 0}
+            else:
+                response = self.server.answer(request)
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+            if request.get('command') == 'shutdown':
+                break
+
+class BarcarolleServer(socketserver.UnixStreamServer):
+    """Serial Unix socket server running Barcarolle requests against one warm MemoryProbeCache."""
+
+    def __init__(self, socket_path, cache):
+        import Barcarolle_Playlist_Generator as barcarolle
+        self.barcarolle = barcarolle
+        self.cache = cache
+        self.stopping = False
+        # A socket file left by a daemon that died is replaced; a live one is not
+        if os.path.exists(socket_path):
+            if ping(socket_path):
+                raise OSError(f"A daemon is already listening on {socket_path}")
+            os.unlink(socket_path)
+        super().__init__(socket_path, RequestHandler)
+        os.chmod(socket_path, 0o600)
+        barcarolle.share_probe_cache(cache)
+
+    def answer(self, request):
+        command = request.get('command', 'run')
+        if command == 'ping':
+            return {'status': 0, 'output': '', 'seconds': 0, 'cached_entries': len(self.cache.entries)}
+        if command == 'shutdown':
+            self.stopping = True
+            return {'status': 0, 'output': "Daemon stopping.\n", 'seconds': 0}
+        return self.run(request.get('argv', []), request.get('cwd'))
+
+    def run(self, argv, cwd=None):
+        start = time.perf_counter()
+        output = io.StringIO()
+        status = 0
+        self.cache.reset_counters()
+        previous_cwd = os.getcwd()
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            try:
+                # Relative paths in argv mean what they meant in the client's directory
+                if cwd:
+                    os.chdir(cwd)
+                args = self.barcarolle.build_parser().parse_args(argv)
+                self.barcarolle.main(args)
+            except SystemExit as e:
+                status = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+                if e.code is not None and not isinstance(e.code, int):
+                    print(e.code)
+            except Exception as e:
+                status = 1
+                print(f"Request failed: {type(e).__name__}: {e}")
+            finally:
+                os.chdir(previous_cwd)
+        seconds = round(time.perf_counter() - start, 3)
+        print(f"Request served in {seconds}s (status {status}, {self.cache.hits} cache hits, {self.cache.misses} misses, "
+              f"{len(self.cache.entries)} entries in memory): {' '.join(argv)}")
+        return {'status': status, 'output': output.getvalue(), 'seconds': seconds}
+
+    def service_actions(self):
+        if self.stopping:
+            # shutdown() waits for serve_forever, so it has to be asked for from another thread
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            self.stopping = False
+
+def connect(socket_path):
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.connect(socket_path)
+    return client
+
+def exchange(socket_path, request):
+    with connect(socket_path) as client, client.makefile('rwb') as stream:
+        stream.write(json.dumps(request).encode('utf-8') + b'\n')
+        stream.flush()
+        return json.loads(stream.readline())
+
+def ping(socket_path):
+    try:
+        return exchange(socket_path, {'command': 'ping'})['status'] == 0
+    except (OSError, ValueError):
+        return False
+
+def send_request(socket_path, argv, cwd=None):
+    """
+    Send a Barcarolle command line to the daemon at socket_path and print its output. Any '-server' pair in argv is
+    dropped first. Returns the exit status the command had in the daemon, for sys.exit.
+    """
+    argv = list(argv)
+    for index, value in enumerate(argv):
+        if value == '-server' and index + 1 < len(argv):
+            del argv[index:index + 2]
+            break
+        if value.startswith('-server='):
+            del argv[index]
+            break
+    try:
+        response = exchange(socket_path, {'argv': argv, 'cwd': cwd or os.getcwd()})
+    except (OSError, ValueError) as e:
+        print(f"Could not reach the Barcarolle daemon at {socket_path}: {e}")
+        return 1
+    print(response['output'], end='')
+    return response['status']
+
+def main(args):
+    import Barcarolle_Playlist_Generator as barcarolle
+    cache = MemoryProbeCache(barcarolle.ProbeCache(args.cache), args.memory_entries)
+    warmed = cache.warm_from_cache(min(args.warm_entries, args.memory_entries))
+    print(f"Warmed {warmed} entries from {args.cache}")
+    for library_dir in args.library or []:
+        if not barcarolle.library_exists(library_dir):
+            print(f"No library at {library_dir}. Skipping...")
+            continue
+        library = barcarolle.MediaLibrary(library_dir)
+        print(f"Warmed {cache.warm_from_library(library)} entries from {library_dir}")
+    server = BarcarolleServer(args.socket, cache)
+    print(f"Listening on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        barcarolle.share_probe_cache(None)
+        cache.shutdown()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(args.socket)
+    print("Daemon stopped.")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve Barcarolle playlist requests from warm in-memory caches over a Unix socket.")
+    parser.add_argument('-socket', default=DEFAULT_SOCKET, help="Unix socket to listen on.")
+    parser.add_argument('-cache', default=DEFAULT_CACHE, help="Persistent probe cache (SQLite) behind the in-memory cache.")
+    parser.add_argument('-library', nargs='+', help="Columnar libraries whose rows pre-load the in-memory cache.")
+    parser.add_argument('-memory_entries', type=int, default=200000, help="Most probe results kept in memory.")
+    parser.add_argument('-warm_entries', type=int, default=100000, help="Most recently seen cache rows loaded at start.")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# Barcarolle_Dedupe.py
+
+"""
+Duplicate detection for media trees, reading as little of each file as possible.
+
+Candidates are grouped by size first, which costs only the stat the scanner already does; files with a
+unique size are never opened. Within a size group each file's head and tail ('HASH_CHUNK' bytes each)
+are hashed through mmap, and only files whose head/tail digests still collide are hashed in full. Files
+no larger than two chunks are covered completely by the head/tail digest and are never read twice.
+
+Digests are kept in a 'hashes' table (see 'HashCache') keyed by path, size and mtime, normally in the
+same SQLite file as the probe cache, so later runs re-read only new or modified files.
+
+One file per group of identical files is kept, chosen by 'KEEP_POLICIES':
+- 'shortest': the shortest path.
+- 'newest': the most recently modified copy.
+- 'root': the first copy under the earliest of the preferred roots.
+Ties always fall back to the shortest path, then alphabetical order, so the choice is deterministic.
+"""
+
+import hashlib
+import mmap
+import os
+from collections import defaultdict
+
+from Barcarolle_Cache import SQLiteCache
+
+HASH_CHUNK = 64 * 1024
+FULL_HASH_BLOCK = 8 * 1024 * 1024
+KEEP_POLICIES = ('shortest', 'newest', 'root')
+
+class HashCache(SQLiteCache):
+    """
+    Persistent head/tail and full digests, only returned while the file's size and mtime still match.
+    Writes are buffered like ProbeCache's, and rows not seen for 'max_age_days' are evicted on close.
+    """
+    TABLE = 'hashes'
+    COLUMNS = '''sample BLOB NOT NULL,
+            full BLOB'''
+
+    def get(self, path, stat):
+        """Return (sample_digest, full_digest or None) for an unchanged file, or None."""
+        return self._lookup(path, stat, 'sample, full')
+
+    def put(self, path, stat, sample, full=None):
+        self._store(path, stat, sample, full)
+
+def sample_digest(path, size):
+    """Digest of the first and last HASH_CHUNK bytes (the whole file when it is at most two chunks)."""
+    digest = hashlib.blake2b(digest_size=16)
+    if size == 0:
+        return digest.digest()
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        try:
+            if size <= 2 * HASH_CHUNK:
+                digest.update(view)
+            else:
+                digest.update(view[:HASH_CHUNK])
+                digest.update(view[size - HASH_CHUNK:])
+        finally:
+            view.release()
+    return digest.digest()
+
+def full_digest(path, size):
+    digest = hashlib.blake2b(digest_size=16)
+    if size == 0:
+        return digest.digest()
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if hasattr(mapped, 'madvise') and hasattr(mmap, 'MADV_SEQUENTIAL'):
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+        view = memoryview(mapped)
+        try:
+            # Block by block, so hashlib releases the GIL on large slices without copying them
+            for offset in range(0, size, FULL_HASH_BLOCK):
+                digest.update(view[offset:offset + FULL_HASH_BLOCK])
+        finally:
+            view.release()
+    return digest.digest()
+
+def keep_key(policy, preferred_roots=()):
+    """Sort key putting the copy to keep first, for (path, stat) pairs."""
+    roots = [os.path.join(os.path.abspath(root), '') for root in preferred_roots or ()]
+
+    def root_rank(path):
+        full_path = os.path.abspath(path)
+        return next((rank for rank, root in enumerate(roots) if full_path.startswith(root)), len(roots))
+
+    if policy == 'newest':
+        return lambda item: (-item[1].st_mtime_ns, len(item[0]), item[0])
+    if policy == 'root':
+        return lambda item: (root_rank(item[0]), len(item[0]), item[0])
+    return lambda item: (len(item[0]), item[0])
+
+def find_duplicates(full_paths, policy='shortest', preferred_roots=(), cache=None, count=None):
+    """
+    Return (kept, duplicates): kept is full_paths in input order without the redundant copies, and
+    duplicates maps every dropped path to the path kept in its place. Files that cannot be stat'ed or read
+    are kept, so the scanner reports them as it would without deduplication. 'count(name, amount)', if
+    given, receives 'dedupe_sampled', 'dedupe_full_hashed', 'dedupe_bytes_read' and 'dedupe_cache_hits'.
+    """
+    count = count or (lambda name, amount=1: None)
+    full_paths = list(full_paths)
+    by_size = defaultdict(list)
+    for path in full_paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        by_size[stat.st_size].append((path, stat))
+
+    duplicates = {}
+    key = keep_key(policy, preferred_roots)
+    hashes_before = cache.hits if cache is not None else 0
+    for size, group in by_size.items():
+        if len(group) < 2:
+            continue
+        # Head/tail digests first; a file small enough to be covered by them is already fully hashed
+        by_sample = defaultdict(list)
+        known = {}
+        for path, stat in group:
+            cached = cache.get(path, stat) if cache is not None else None
+            if cached is None:
+                try:
+                    sample = sample_digest(path, size)
+                except OSError:
+                    continue
+                count('dedupe_sampled')
+                count('dedupe_bytes_read', min(size, 2 * HASH_CHUNK))
+                cached = (sample, sample if size <= 2 * HASH_CHUNK else None)
+                if cache is not None:
+                    cache.put(path, stat, *cached)
+            known[path] = cached
+            by_sample[cached[0]].append((path, stat))
+
+        for candidates in by_sample.values():
+            if len(candidates) < 2:
+                continue
+            by_full = defaultdict(list)
+            for path, stat in candidates:
+                sample, full = known[path]
+                if full is None:
+                    try:
+                        full = full_digest(path, size)
+                    except OSError:
+                        continue
+                    count('dedupe_full_hashed')
+                    count('dedupe_bytes_read', size)
+                    if cache is not None:
+                        cache.put(path, stat, sample, full)
+                by_full[full].append((path, stat))
+            for copies in by_full.values():
+                copies.sort(key=key)
+                for path, _ in copies[1:]:
+                    duplicates[path] = copies[0][0]
+
+    if cache is not None:
+        count('dedupe_cache_hits', cache.hits - hashes_before)
+    return [path for path in full_paths if path not in duplicates], duplicates
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# Barcarolle_Library.py
+
+"""
+Columnar store of probed library metadata, so many differently filtered playlists can be built from a
+single probe pass.
+
+A library is a directory holding one NumPy '.npy' file per column ('duration', 'width', 'height',
+'rotation', 'size', 'mtime'), the relative paths as one UTF-8 blob ('paths.bin') with their start
+offsets ('path_offsets.npy'), and 'meta.json' (format version, scanned root, the root's tree fingerprint
+at build time, the '-dedupe' settings the rows were deduplicated with, row count), so a stale library can
+be told from a current one. Rows are in
+walk order, so an unfiltered query reproduces the order of a normal scan. Columns are memory-mapped
+on load, and only the rows a query selects have their paths decoded.
+
+Every filter in 'LIBRARY_FILTERS' is the vectorized twin of the '@media_filter' of the same name in
+Barcarolle_Playlist_Generator.py: it reads the same arguments and returns a boolean mask over all rows
+(or None when it is not active). Missing widths/heights are stored as 0 and never match the
+orientation, aspect or resolution filters.
+
+NumPy is only needed to build or query a library; it is imported on first use.
+"""
+
+import json
+import os
+import shutil
+from array import array
+from datetime import date, datetime
+
+LIBRARY_VERSION = 1
+LIBRARY_COLUMNS = {'duration': ('d', 'float64'), 'width': ('l', 'int32'), 'height': ('l', 'int32'),
+                   'rotation': ('l', 'int16'), 'size': ('q', 'int64'), 'mtime': ('d', 'float64')}
+META_FILENAME = 'meta.json'
+PATHS_FILENAME = 'paths.bin'
+OFFSETS_FILENAME = 'path_offsets.npy'
+
+# Tier name -> minimum length of the displayed frame's short side, in pixels
+RESOLUTION_TIERS = {'sd': 0, 'hd': 720, 'fhd': 1080, 'qhd': 1440, 'uhd': 2160}
+MIB = 1024 * 1024
+
+def require_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("The columnar library needs NumPy. Install it with 'pip install numpy'.")
+    return numpy
+
+def resolution_tier(width, height):
+    if not width or not height:
+        return None
+    short_side = min(width, height)
+    return max((tier for tier, minimum in RESOLUTION_TIERS.items() if short_side >= minimum),
+               key=RESOLUTION_TIERS.get)
+
+def since_timestamp(value):
+    # Accepts a POSIX timestamp, a date/datetime (YAML parses bare dates) or an ISO 8601 string
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day).timestamp()
+    return datetime.fromisoformat(str(value)).timestamp()
+
+def library_exists(library_dir):
+    return os.path.exists(os.path.join(library_dir, META_FILENAME))
+
+def write_library(library_dir, root, rows, fingerprint, dedupe=None):
+    """
+    Write rows of (relative_path, duration, width, height, rotation, size, mtime) as a new library,
+    built beside library_dir and swapped into place once complete. 'fingerprint' identifies the state of
+    the tree the rows were read from, and 'dedupe' the settings duplicates were dropped with (None if
+    they were not). Returns the number of rows.
+    """
+    numpy = require_numpy()
+    columns = {name: array(typecode) for name, (typecode, _) in LIBRARY_COLUMNS.items()}
+    offsets = array('q', [0])
+    paths = bytearray()
+    for relative_path, *values in rows:
+        for column, value in zip(columns.values(), values):
+            column.append(value or 0)
+        paths += relative_path.encode('utf-8', 'surrogateescape')
+        offsets.append(len(paths))
+
+    library_dir = os.path.abspath(library_dir)
+    temp_dir = f"{library_dir}.{os.getpid()}.tmp"
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+    try:
+        for name, (_, dtype) in LIBRARY_COLUMNS.items():
+            numpy.save(os.path.join(temp_dir, f"{name}.npy"), numpy.array(columns[name], dtype=dtype))
+        numpy.save(os.path.join(temp_dir, OFFSETS_FILENAME), numpy.array(offsets, dtype='int64'))
+        with open(os.path.join(temp_dir, PATHS_FILENAME), 'wb') as f:
+            f.write(paths)
+        with open(os.path.join(temp_dir, META_FILENAME), 'w') as f:
+            json.dump({'version': LIBRARY_VERSION, 'root': root, 'fingerprint': fingerprint, 'dedupe': dedupe,
+                       'count': len(offsets) - 1}, f)
+        # A directory cannot be renamed over a non-empty one, so the old library steps aside first
+        old_dir = f"{library_dir}.{os.getpid()}.old"
+        if os.path.exists(library_dir):
+            os.replace(library_dir, old_dir)
+        os.replace(temp_dir, library_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    return len(offsets) - 1
+
+class MediaLibrary:
+    """A memory-mapped library; 'select' turns the active filters into one boolean mask over all rows."""
+
+    def __init__(self, library_dir):
+        self.numpy = numpy = require_numpy()
+        with open(os.path.join(library_dir, META_FILENAME), 'r') as f:
+            self.meta = json.load(f)
+        if self.meta.get('version') != LIBRARY_VERSION:
+            raise ValueError(f"Unsupported library version in {library_dir}: {self.meta.get('version')}")
+        self.count = self.meta['count']
+        self.columns = {name: numpy.load(os.path.join(library_dir, f"{name}.npy"), mmap_mode='r')
+                        for name in LIBRARY_COLUMNS}
+        self.offsets = numpy.load(os.path.join(library_dir, OFFSETS_FILENAME), mmap_mode='r')
+        paths_file = os.path.join(library_dir, PATHS_FILENAME)
+        # numpy cannot memory-map an empty file
+        self.paths = numpy.memmap(paths_file, dtype='uint8', mode='r') if os.path.getsize(paths_file) else b''
+        self._display_size = None
+
+    @property
+    def root(self):
+        return self.meta['root']
+
+    @property
+    def fingerprint(self):
+        return self.meta['fingerprint']
+
+    @property
+    def dedupe(self):
+        return self.meta['dedupe']
+
+    def __len__(self):
+        return self.count
+
+    def display_size(self):
+        # Frame size as shown, honouring 90/270 degree rotation flags, like MediaInfo.display_size
+        if self._display_size is None:
+            numpy = self.numpy
+            width, height = self.columns['width'], self.columns['height']
+            rotated = numpy.isin(self.columns['rotation'], (90, 270))
+            self._display_size = numpy.where(rotated, height, width), numpy.where(rotated, width, height)
+        return self._display_size
+
+    def path(self, index):
+        return bytes(self.paths[self.offsets[index]:self.offsets[index + 1]]).decode('utf-8', 'surrogateescape')
+
+    def row(self, index):
+        return {name: column[index].item() for name, column in self.columns.items()}
+
+    def select(self, args, names=None):
+        """Return the indices of the rows passing every active filter in 'names' (default: all of LIBRARY_FILTERS)."""
+        mask = self.numpy.ones(self.count, dtype=bool)
+        for name in (LIBRARY_FILTERS if names is None else names):
+            filter_mask = LIBRARY_FILTERS[name](args, self)
+            if filter_mask is not None:
+                mask &= filter_mask
+        return self.numpy.flatnonzero(mask)
+
+LIBRARY_FILTERS = {}
+
+def library_filter(name):
+    def register(factory):
+        LIBRARY_FILTERS[name] = factory
+        return factory
+    return register
+
+@library_filter('length')
+def length_mask(args, library):
+    min_length = getattr(args, 'min_length', None)
+    max_length = getattr(args, 'max_length', None)
+    if not (min_length or max_length):
+        return None
+    duration = library.columns['duration']
+    mask = library.numpy.ones(len(library), dtype=bool)
+    if min_length:
+        mask &= duration >= min_length
+    if max_length:
+        mask &= duration <= max_length
+    return mask
+
+@library_filter('orientation')
+def orientation_mask(args, library):
+    portrait = getattr(args, 'portrait', False)
+    horz = getattr(args, 'horz', False)
+    if not (portrait or horz):
+        return None
+    width, height = library.display_size()
+    is_portrait = (width > 0) & (height > 0) & (width < height)
+    mask = library.numpy.ones(len(library), dtype=bool)
+    if portrait:
+        mask &= is_portrait
+    if horz:
+        mask &= ~is_portrait
+    return mask
+
+@library_filter('aspect')
+def aspect_mask(args, library):
+    min_aspect = getattr(args, 'min_aspect', None)
+    max_aspect = getattr(args, 'max_aspect', None)
+    if not (min_aspect or max_aspect):
+        return None
+    numpy = library.numpy
+    width, height = library.display_size()
+    known = (width > 0) & (height > 0)
+    aspect = numpy.divide(width, height, out=numpy.zeros(len(library)), where=known)
+    mask = known
+    if min_aspect:
+        mask &= aspect >= min_aspect
+    if max_aspect:
+        mask &= aspect <= max_aspect
+    return mask
+
+@library_filter('resolution')
+def resolution_mask(args, library):
+    tiers = getattr(args, 'resolution', None)
+    if not tiers:
+        return None
+    numpy = library.numpy
+    tiers = [tiers] if isinstance(tiers, str) else tiers
+    names = sorted(RESOLUTION_TIERS, key=RESOLUTION_TIERS.get)
+    width, height = library.display_size()
+    short_side = numpy.minimum(width, height)
+    tier_index = numpy.searchsorted([RESOLUTION_TIERS[name] for name in names], short_side, side='right') - 1
+    return (width > 0) & (height > 0) & numpy.isin(tier_index, [names.index(tier) for tier in tiers])
+
+@library_filter('size')
+def size_mask(args, library):
+    min_size = getattr(args, 'min_size', None)
+    max_size = getattr(args, 'max_size', None)
+    if not (min_size or max_size):
+        return None
+    size = library.columns['size']
+    mask = library.numpy.ones(len(library), dtype=bool)
+    if min_size:
+        mask &= size >= min_size * MIB
+    if max_size:
+        mask &= size <= max_size * MIB
+    return mask
+
+@library_filter('modified')
+def modified_mask(args, library):
+    since = since_timestamp(getattr(args, 'modified_since', None))
+    if since is None:
+        return None
+    return library.columns['mtime'] >= since
@@ -36,17 +36,53 @@ Parameters Table:
 | -max_length | float             | -           | Include videos shorter than this value in seconds.    | -max_length 120                                       |
 | -filename   | str                 | -           | Specify a filename for the playlist file.                  | -filename custom_playlist.m3u8                      |
 | -zip          | str                 | yes       | Create a .7z compressed archive of output? 'yes' or 'no'.| -zip no                                               |
+| -archive_preset | str               | balanced  | 'store', 'fast', 'balanced', 'max', 'deflate' or 'bzip2'.   | -archive_preset fast                                  |
+| -sample       | int                 | -         | Keep N random matching videos (one pass, memory for N only).| -sample 500                                           |
+| -budget       | str                 | -         | Keep random videos until their runtime reaches this.        | -budget 2h                                            |
+| -seed         | int                 | -         | Seed for -shuffle/-sample/-budget, for reproducible output.  | -seed 42                                              |
+| -stats        | flag                | False     | Print per-stage timings and counters, and save them as JSON.| -stats                                                |
+| -jobs         | int                 | CPU count | Number of ffprobe processes to run at once.                 | -jobs 16                                              |
+| -header_probe | str                 | yes       | Read MP4/MOV/MKV/WebM headers in-process instead of ffprobe?| -header_probe no                                      |
+| -probe_mode   | str                 | lean      | 'lean' (first video stream, needed fields) or 'full' ffprobe.| -probe_mode full                                      |
+| -probe_timeout | float              | 30        | Kill an ffprobe run after this many seconds (0: never).     | -probe_timeout 10                                     |
+| -cache        | str                 | see note  | SQLite probe cache file (default: next to the output).     | -cache /var/cache/barcarolle.sqlite                   |
+| -cache_mode   | str                 | use       | 'use', 'rebuild' (drop and re-probe) or 'off' (bypass).    | -cache_mode rebuild                                   |
+| -cache_max_entries | int           | 1000000   | Evict least recently seen entries beyond this count.        | -cache_max_entries 500000                             |
+| -cache_max_age | float             | 30        | Evict entries for files not seen for this many days.        | -cache_max_age 7                                      |
+| -min_aspect   | float               | -         | Include videos whose displayed width/height is at least this.| -min_aspect 1.7                                       |
+| -max_aspect   | float               | -         | Include videos whose displayed width/height is at most this. | -max_aspect 0.6                                       |
+| -resolution   | str (one or more)   | -         | Include only these tiers: sd, hd, fhd, qhd, uhd.            | -resolution fhd uhd                                   |
+| -min_size     | float               | -         | Include files of at least this many MiB.                    | -min_size 100                                         |
+| -max_size     | float               | -         | Include files of at most this many MiB.                     | -max_size 2048                                        |
+| -modified_since | str             | -         | Include files modified on or after this ISO date/time.      | -modified_since 2024-01-31                            |
+| -library      | str                 | -         | Answer filters from this columnar library (needs NumPy).    | -library /var/cache/barcarolle-library                |
+| -library_mode | str                 | use       | 'use' (build if missing/stale) or 'refresh' (always rebuild).| -library_mode refresh                                 |
+| -server       | str                 | -         | Hand the request to a running Barcarolle_Daemon.py socket.  | -server /tmp/barcarolle.sock                          |
+| -dedupe       | str                 | no        | Keep one copy of identical files? 'yes' or 'no'.           | -dedupe yes                                           |
+| -dedupe_keep  | str                 | shortest  | Copy to keep: 'shortest' path, 'newest', or 'root'.         | -dedupe_keep newest                                   |
+| -prefer_root  | str (one or more)   | -         | Roots, most preferred first, for '-dedupe_keep root'.       | -prefer_root /media/originals                         |
 
 Note: Replace the placeholder paths with real paths on your system as needed.
 For more about Barcarolle_Playlist_Generator.py:
 - Dependencies: ffmpeg, ffprobe, ffmpeg-python, pip.
+- 'run_header_probe': Reads duration and frame size from MP4/MKV headers in-process, falling back to ffprobe.
+- 'run_lean_probe': Asks ffprobe for the first video stream's size, codec and rotation and the duration only, with a timeout.
 - Use command line arguments per argparse for options.
 - Performs validity checks for directory and file existence.
 - Checks dependencies at runtime; installs missing ones via pip.
 - 'scan_directory': Scans for videos, filters by length and orientation.
+- 'scan_relative' / 'render_entry': Scan once into mount-neutral relative paths, then render them for any client mount.
+- 'iter_playlist' / 'write_playlist': Stream accepted entries straight into a temp file that is renamed into place when complete.
+- 'ProbeCache': Remembers ffprobe results across runs, keyed by path, size and mtime (SQLite handling shared with '-dedupe' digests in Barcarolle_Cache.py).
+- 'open_library' / 'iter_library_relative': Probe once into the columnar store of Barcarolle_Library.py, then filter it with vectorized masks.
+- 'MediaInfo': One record per probed file; every filter in 'MEDIA_FILTERS' is a predicate over it, so each file is probed once.
 - 'generate_filters_flag': Defines video selection flags based on user input.
 - 'generate_output_folder': Makes sure the output folder is available.
+- 'create_7z_archive' / 'ArchiveWorker': Preset-driven, incremental .7z archiving, optionally on a background thread.
 - 'main()': Runs the overall playlist generation process.
+- 'RunStats': Per-stage timers, counters and probe latency histogram behind '-stats'.
+- 'limit_probes': Caps concurrent ffprobe runs with a shared semaphore (used by Manato's process pool).
+- 'share_probe_cache' / 'build_parser': Hooks Barcarolle_Daemon.py uses to serve CLI-identical requests from warm caches.
 ------
 
 """
@@ -54,62 +90,778 @@ For more about Barcarolle_Playlist_Generator.py:
 
 import os
 import argparse
+import bisect
+import contextlib
+import hashlib
+import heapq
+import json
+import math
+import posixpath
 import random
+import re
 import string
+import subprocess
 import sys
+import tempfile
+import threading
+import time
+from array import array
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
+from functools import partial
+from itertools import islice
 
 # Third-party imports for handling video-processing and archive creation
 import ffmpeg
 import py7zr
 
+from Barcarolle_Cache import SQLiteCache
+from Barcarolle_Container_Headers import read_container_info
+from Barcarolle_Dedupe import KEEP_POLICIES, HashCache, find_duplicates
+from Barcarolle_Library import LIBRARY_FILTERS, MIB, RESOLUTION_TIERS, MediaLibrary, library_exists, resolution_tier, \
+    since_timestamp, write_library
+
 VIDEO_EXTENSIONS = ['mp4', 'avi', 'mov', 'mkv', 'flv', 'wmv', 'm4v', 'webm', '3gp', 'ogv', 'mpg', 'mpeg', 'm2v', 'm4p', 'm4v', 'mp2', 'mpe', 'mpv', 'm2ts', 'mxf', 'yuv', 'rm', 'asf', 'vob', 'amv', 'rmvb', 'drc', 'gifv', 'mts', 'mts', 'm2ts', 'qt', 'svi', '3g2', 'roq', 'nsv', 'f4v', 'f4p', 'f4a', 'f4b']
 
+class RunStats:
+    """
+    Per-stage wall/CPU time, file counters and a probe latency histogram for one run.
+    Stages nest: time spent in an inner stage (e.g. 'walk' pulled from inside 'probe') is subtracted from the
+    outer one, so every stage reports exclusive time. Stage timing is for the scanning thread only; worker
+    threads report through record_probe and add_stage, which are locked.
+    """
+    LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self.started = (time.perf_counter(), time.process_time())
+        self.finished = None
+        self.stages = {}
+        self.counters = Counter()
+        self.latency = [0] * (len(self.LATENCY_BUCKETS) + 1)
+        self.probe_seconds = 0.0
+        self._stack = []
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Sent back from worker processes; the lock and the open-stage stack stay behind
+        state = self.__dict__.copy()
+        del state['_lock'], state['_stack']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, _lock=threading.Lock(), _stack=[])
+
+    def count(self, name, amount=1):
+        self.counters[name] += amount
+
+    def add_stage(self, name, wall, cpu, calls=1):
+        with self._lock:
+            entry = self.stages.setdefault(name, [0.0, 0.0, 0])
+            entry[0] += wall
+            entry[1] += cpu
+            entry[2] += calls
+
+    def _enter(self, name):
+        self._stack.append((name, time.perf_counter(), time.process_time()))
+
+    def _exit(self):
+        name, wall_start, cpu_start = self._stack.pop()
+        wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+        self.add_stage(name, wall, cpu)
+        if self._stack:
+            self.add_stage(self._stack[-1][0], -wall, -cpu, calls=0)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        self._enter(name)
+        try:
+            yield
+        finally:
+            self._exit()
+
+    def timed_iter(self, name, iterable):
+        # Charges the time spent producing each item to 'name'
+        iterator = iter(iterable)
+        while True:
+            self._enter(name)
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self._exit()
+            yield item
+
+    def record_probe(self, seconds):
+        with self._lock:
+            self.latency[bisect.bisect_left(self.LATENCY_BUCKETS, seconds)] += 1
+            self.probe_seconds += seconds
+
+    def timed_probe(self, probe):
+        def run(full_path):
+            start = time.perf_counter()
+            try:
+                return probe(full_path)
+            finally:
+                self.record_probe(time.perf_counter() - start)
+        return run
+
+    def finish(self):
+        self.finished = (time.perf_counter() - self.started[0], time.process_time() - self.started[1])
+        return self
+
+    def merge(self, other):
+        for name, (wall, cpu, calls) in other.stages.items():
+            self.add_stage(name, wall, cpu, calls)
+        self.counters.update(other.counters)
+        with self._lock:
+            self.latency = [mine + theirs for mine, theirs in zip(self.latency, other.latency)]
+            self.probe_seconds += other.probe_seconds
+
+    def to_dict(self):
+        wall, cpu = self.finished or (time.perf_counter() - self.started[0], time.process_time() - self.started[1])
+        probes = sum(self.latency)
+        labels = [f"<={bound:g}s" for bound in self.LATENCY_BUCKETS] + [f">{self.LATENCY_BUCKETS[-1]:g}s"]
+        return {
+            'total': {'wall_seconds': round(wall, 6), 'cpu_seconds': round(cpu, 6)},
+            'stages': {name: {'wall_seconds': round(stage_wall, 6), 'cpu_seconds': round(stage_cpu, 6), 'calls': calls}
+                       for name, (stage_wall, stage_cpu, calls) in self.stages.items()},
+            'counters': dict(self.counters),
+            'probe_latency': {
+                'count': probes,
+                'total_seconds': round(self.probe_seconds, 6),
+                'mean_seconds': round(self.probe_seconds / probes, 6) if probes else None,
+                'histogram': dict(zip(labels, self.latency)),
+            },
+        }
+
+    def report(self, json_file=None, title="Run statistics"):
+        report = self.to_dict()
+        print(f"\n{title}:")
+        print("{:<26} {:>12} {:>12}".format("Stage", "Wall (s)", "CPU (s)"))
+        for name, stage in report['stages'].items():
+            print("{:<26} {:>12.3f} {:>12.3f}".format(name, stage['wall_seconds'], stage['cpu_seconds']))
+        print("{:<26} {:>12.3f} {:>12.3f}".format("total", report['total']['wall_seconds'], report['total']['cpu_seconds']))
+        for name, value in sorted(report['counters'].items()):
+            print("{:<26} {:>12}".format(name, value))
+        latency = report['probe_latency']
+        if latency['count']:
+            print(f"Probe latency: {latency['count']} probes, mean {latency['mean_seconds'] * 1000:.1f} ms")
+            for label, count in latency['histogram'].items():
+                if count:
+                    print("  {:<10} {:>10}".format(label, count))
+        if json_file:
+            with open(json_file, 'w') as f:
+                json.dump(report, f, indent=2)
+            print(f"Statistics written to: {json_file}")
+        return report
+
 def is_valid_file(parser, arg):
     if not os.path.exists(arg):
         parser.error(f"The file {arg} does not exist!")
     else:
         return arg
 
-def validate_length(args, full_path):
-    try:
-        probe = ffmpeg.probe(full_path)
+class MediaInfo:
+    """Compact record of the probe fields every filter works from; one per probed file."""
+    __slots__ = ('duration', 'width', 'height', 'rotation', 'codec', 'has_video', 'size', 'mtime')
+
+    def __init__(self, duration=None, width=None, height=None, rotation=0, codec=None, has_video=False,
+                 size=None, mtime=None):
+        self.duration = duration
+        self.width = width
+        self.height = height
+        self.rotation = rotation
+        self.codec = codec
+        self.has_video = has_video
+        self.size = size
+        self.mtime = mtime
+
+    def with_stat(self, stat):
+        # Size and mtime come from the file itself, not the probe, so cached records pick up the current values
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+        return self
+
+    @classmethod
+    def from_probe(cls, probe):
         video_info = next((stream for stream in probe['streams'] if stream['codec_type'] == 'video'), None)
+        duration = float(probe['format']['duration']) if 'duration' in probe['format'] else None
         if video_info is None:
-            print(f"File: {full_path} is not a valid video. Skipping...")
-            return False
-        if 'duration' in probe['format']:
-            duration = float(probe['format']['duration'])
-        else:
-            print(f"No duration found for file: {full_path}. Skipping...")
-            return False
+            return cls(duration=duration)
+        return cls(duration=duration,
+                   width=int(video_info['width']) if 'width' in video_info else None,
+                   height=int(video_info['height']) if 'height' in video_info else None,
+                   rotation=stream_rotation(video_info),
+                   codec=video_info.get('codec_name'),
+                   has_video=True)
+
+    @property
+    def display_size(self):
+        # Phone footage is usually stored landscape with a 90/270 degree rotation flag
+        if self.rotation in (90, 270):
+            return self.height, self.width
+        return self.width, self.height
+
+    @property
+    def is_portrait(self):
+        width, height = self.display_size
+        return width is not None and height is not None and width < height
+
+    @property
+    def aspect(self):
+        width, height = self.display_size
+        return width / height if width and height else None
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)
+        return f'MediaInfo({fields})'
+
+def stream_rotation(stream):
+    # Clockwise degrees, as in the legacy 'rotate' tag; display matrix side data is counterclockwise
+    rotation = stream.get('tags', {}).get('rotate')
+    for side_data in stream.get('side_data_list', []):
+        if 'rotation' in side_data:
+            rotation = -float(side_data['rotation'])
+    try:
+        return int(float(rotation or 0)) % 360
+    except ValueError:
+        return 0
+
+PROBE_CACHE_FILENAME = '.barcarolle_probe_cache.sqlite'
+
+class ProbeCache(SQLiteCache):
+    """
+    Persistent store of ffprobe results so repeat runs only probe new or modified files.
+    Entries are keyed by path and only returned while the file's size and mtime still match.
+    Writes are buffered and flushed in one short transaction, so several processes can share the file
+    without holding its write lock while they probe (see Barcarolle_Cache.py).
+    """
+    SCHEMA_VERSION = 2
+    TABLE = 'probes'
+    COLUMNS = '''duration REAL,
+            width INTEGER,
+            height INTEGER,
+            rotation INTEGER NOT NULL,
+            codec TEXT,
+            has_video INTEGER NOT NULL'''
+
+    def _prepare(self, rebuild):
+        version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+        super()._prepare(rebuild or version != self.SCHEMA_VERSION)
+        self.conn.execute(f'PRAGMA user_version = {self.SCHEMA_VERSION}')
+
+    def get(self, path, stat):
+        row = self._lookup(path, stat, 'duration, width, height, rotation, codec, has_video')
+        if row is None:
+            return None
+        return MediaInfo(row[0], row[1], row[2], row[3], row[4], bool(row[5]))
+
+    def put(self, path, stat, info):
+        self._store(path, stat, info.duration, info.width, info.height, info.rotation, info.codec, int(info.has_video))
+
+# A long-lived cache (e.g. Barcarolle_Daemon's in-memory LRU) that every scan uses instead of opening its own
+SHARED_PROBE_CACHE = None
+
+def share_probe_cache(cache):
+    """
+    Make every scan use 'cache' (anything with ProbeCache's get/put/clear/close/hits and db_path) instead of opening
+    its own; '-dedupe' digests then go to the same file. None restores per-run caches.
+    """
+    global SHARED_PROBE_CACHE
+    SHARED_PROBE_CACHE = cache
+
+def open_probe_cache(args):
+    mode = getattr(args, 'cache_mode', 'use') or 'use'
+    if mode == 'off':
+        return None
+    if SHARED_PROBE_CACHE is not None:
+        if mode == 'rebuild':
+            SHARED_PROBE_CACHE.clear()
+        return SHARED_PROBE_CACHE
+    db_path = getattr(args, 'cache', None) or os.path.join(args.output, PROBE_CACHE_FILENAME)
+    return ProbeCache(db_path,
+                      max_entries=getattr(args, 'cache_max_entries', None),
+                      max_age_days=getattr(args, 'cache_max_age', None),
+                      rebuild=(mode == 'rebuild'))
+
+def open_hash_cache(args):
+    # Content digests for '-dedupe' live in their own table of the probe cache file
+    mode = getattr(args, 'cache_mode', 'use') or 'use'
+    if mode == 'off':
+        return None
+    if SHARED_PROBE_CACHE is not None:
+        db_path = SHARED_PROBE_CACHE.db_path
+    else:
+        db_path = getattr(args, 'cache', None) or os.path.join(args.output, PROBE_CACHE_FILENAME)
+    return HashCache(db_path, max_age_days=getattr(args, 'cache_max_age', None), rebuild=(mode == 'rebuild'))
+
+# Optional semaphore (threading or multiprocessing) every ffprobe run holds, to cap them across threads or processes
+PROBE_SLOTS = None
+
+def limit_probes(slots):
+    """Make every ffprobe run hold one of 'slots' (a semaphore shared by all scanners); None lifts the cap."""
+    global PROBE_SLOTS
+    PROBE_SLOTS = slots
+
+def probe_slot():
+    return PROBE_SLOTS if PROBE_SLOTS is not None else contextlib.nullcontext()
+
+DEFAULT_PROBE_TIMEOUT = 30
+
+def run_ffprobe(options, full_path, timeout=None):
+    """
+    Run ffprobe with 'options' on full_path and return its output. It is killed after 'timeout' seconds
+    (None or 0 waits forever); failures and timeouts raise ffmpeg.Error like ffmpeg.probe does.
+    """
+    try:
+        with probe_slot():
+            result = subprocess.run(['ffprobe', '-v', 'error', *options, full_path], capture_output=True,
+                                    timeout=timeout or None)
+    except subprocess.TimeoutExpired as e:
+        raise ffmpeg.Error(f'ffprobe (timed out after {timeout:g}s on {full_path})', e.stdout or b'', e.stderr or b'')
+    if result.returncode != 0:
+        raise ffmpeg.Error('ffprobe', result.stdout, result.stderr)
+    return result.stdout.decode('utf-8', 'replace')
+
+def run_probe(full_path, timeout=None):
+    # The complete JSON document ffmpeg.probe would return, through run_ffprobe so it can time out too
+    return MediaInfo.from_probe(json.loads(run_ffprobe(['-show_format', '-show_streams', '-of', 'json'], full_path, timeout)))
+
+# Only the fields MediaInfo reads, from the first video stream, as plain key=value lines
+LEAN_PROBE_ENTRIES = 'format=duration:stream=codec_name,width,height:stream_tags=rotate:stream_side_data=rotation'
+
+def run_lean_probe(full_path, timeout=DEFAULT_PROBE_TIMEOUT):
+    """
+    Probe with '-select_streams v:0' and '-show_entries' limited to LEAN_PROBE_ENTRIES, so ffprobe skips every
+    audio/subtitle stream and there is no full JSON document to parse. Times out and fails like run_ffprobe.
+    """
+    return parse_lean_probe(run_ffprobe(['-select_streams', 'v:0', '-show_entries', LEAN_PROBE_ENTRIES,
+                                         '-of', 'default=noprint_wrappers=1'], full_path, timeout))
+
+def parse_lean_probe(output):
+    fields = {}
+    for line in output.splitlines():
+        key, sep, value = line.partition('=')
+        if sep and value.strip() not in ('', 'N/A'):
+            fields.setdefault(key.strip(), value.strip())
+    duration = float(fields['duration']) if 'duration' in fields else None
+    if 'codec_name' not in fields and 'width' not in fields:
+        return MediaInfo(duration=duration)
+    # Shaped like a stream from ffprobe's JSON so stream_rotation reads either source
+    stream = {'tags': {'rotate': fields['TAG:rotate']} if 'TAG:rotate' in fields else {},
+              'side_data_list': [{'rotation': fields['rotation']}] if 'rotation' in fields else []}
+    return MediaInfo(duration=duration,
+                     width=int(fields['width']) if 'width' in fields else None,
+                     height=int(fields['height']) if 'height' in fields else None,
+                     rotation=stream_rotation(stream),
+                     codec=fields.get('codec_name'),
+                     has_video=True)
+
+def run_header_probe(full_path, fallback=None):
+    # MP4/MOV and MKV/WebM headers are read in-process; anything else, or anything unparseable, goes to ffprobe
+    header = read_container_info(full_path)
+    if header is None:
+        return (fallback or run_probe)(full_path)
+    duration, width, height, rotation, codec = header
+    return MediaInfo(duration, width, height, rotation, codec, has_video=True)
+
+def select_probe(args):
+    timeout = getattr(args, 'probe_timeout', DEFAULT_PROBE_TIMEOUT)
+    ffprobe = partial(run_probe if getattr(args, 'probe_mode', 'lean') == 'full' else run_lean_probe, timeout=timeout)
+    if getattr(args, 'header_probe', 'yes') == 'yes':
+        return partial(run_header_probe, fallback=ffprobe)
+    return ffprobe
+
+def probe_media(full_path, cache=None, probe=run_probe, stat=None):
+    stat = stat if stat is not None else os.stat(full_path)
+    info = cache.get(full_path, stat) if cache is not None else None
+    if info is None:
+        info = probe(full_path)
+        if cache is not None:
+            cache.put(full_path, stat, info)
+    return info.with_stat(stat)
+
+# Each worker keeps this many probes queued so it never idles, while the walker stays at most
+# jobs * PROBE_QUEUE_FACTOR files ahead of the consumer instead of queueing the whole tree.
+PROBE_QUEUE_FACTOR = 4
+
+def probe_files(full_paths, cache=None, jobs=1, probe=run_probe):
+    """
+    Yield (full_path, MediaInfo, error) for every path, in input order, probing up to 'jobs' files at once.
+    Cache lookups and writes stay on the calling thread; only ffprobe runs in the pool.
+    A file that cannot be stat'ed (deleted since the walk, dangling symlink) is yielded with its OSError.
+    """
+    if jobs <= 1:
+        for full_path in full_paths:
+            try:
+                stat = os.stat(full_path)
+            except OSError as e:
+                yield full_path, None, e
+                continue
+            try:
+                yield full_path, probe_media(full_path, cache, probe, stat), None
+            except ffmpeg._run.Error as e:
+                yield full_path, None, e
+        return
+
+    def finish(full_path, stat, result):
+        if isinstance(result, OSError):
+            return full_path, None, result
+        if not isinstance(result, Future):
+            return full_path, result.with_stat(stat), None
+        try:
+            info = result.result()
+        except ffmpeg._run.Error as e:
+            return full_path, None, e
+        if cache is not None:
+            cache.put(full_path, stat, info)
+        return full_path, info.with_stat(stat), None
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for full_path in full_paths:
+            try:
+                stat = os.stat(full_path)
+            except OSError as e:
+                pending.append((full_path, None, e))
+            else:
+                info = cache.get(full_path, stat) if cache is not None else None
+                pending.append((full_path, stat, info if info is not None else executor.submit(probe, full_path)))
+            while len(pending) >= jobs * PROBE_QUEUE_FACTOR:
+                yield finish(*pending.popleft())
+        while pending:
+            yield finish(*pending.popleft())
+
+# Filters are registered as factories taking the parsed args and returning a predicate over a
+# MediaInfo record, or None when the filter is not requested. New criteria only need a factory here;
+# they never add another probe.
+MEDIA_FILTERS = {}
+
+def media_filter(name):
+    def register(factory):
+        MEDIA_FILTERS[name] = factory
+        return factory
+    return register
+
+@media_filter('length')
+def length_filter(args):
+    min_length = getattr(args, 'min_length', None)
+    max_length = getattr(args, 'max_length', None)
+    if not (min_length or max_length):
+        return None
+    return lambda info: not ((min_length and info.duration < min_length) or (max_length and info.duration > max_length))
+
+@media_filter('orientation')
+def orientation_filter(args):
+    portrait = getattr(args, 'portrait', False)
+    horz = getattr(args, 'horz', False)
+    if not (portrait or horz):
+        return None
+    return lambda info: not ((portrait and not info.is_portrait) or (horz and info.is_portrait))
+
+@media_filter('aspect')
+def aspect_filter(args):
+    min_aspect = getattr(args, 'min_aspect', None)
+    max_aspect = getattr(args, 'max_aspect', None)
+    if not (min_aspect or max_aspect):
+        return None
+    return lambda info: info.aspect is not None and \
+        not ((min_aspect and info.aspect < min_aspect) or (max_aspect and info.aspect > max_aspect))
+
+@media_filter('resolution')
+def resolution_filter(args):
+    tiers = getattr(args, 'resolution', None)
+    if not tiers:
+        return None
+    tiers = {tiers} if isinstance(tiers, str) else set(tiers)
+    return lambda info: resolution_tier(info.width, info.height) in tiers
+
+@media_filter('size')
+def size_filter(args):
+    min_size = getattr(args, 'min_size', None)
+    max_size = getattr(args, 'max_size', None)
+    if not (min_size or max_size):
+        return None
+    return lambda info: info.size is not None and \
+        not ((min_size and info.size < min_size * MIB) or (max_size and info.size > max_size * MIB))
+
+@media_filter('modified')
+def modified_filter(args):
+    since = since_timestamp(getattr(args, 'modified_since', None))
+    if since is None:
+        return None
+    return lambda info: info.mtime is not None and info.mtime >= since
+
+def build_filters(args):
+    return [predicate for predicate in (factory(args) for factory in MEDIA_FILTERS.values()) if predicate is not None]
+
+def is_playable(full_path, info):
+    if not info.has_video:
+        print(f"File: {full_path} is not a valid video. Skipping...")
+        return False
+    if info.duration is None:
+        print(f"No duration found for file: {full_path}. Skipping...")
+        return False
+    return True
+
+def accept_media(full_path, filters, cache=None, probe=run_probe, stats=None):
+    stats = stats if stats is not None else RunStats()
+    try:
+        stat = os.stat(full_path)
+    except OSError as e:
+        # Deleted since the walk, or a dangling symlink
+        stats.count('skipped_probe_error')
+        print(str(e))
+        return False
+    try:
+        with stats.stage('probe'):
+            info = probe_media(full_path, cache, stats.timed_probe(probe), stat)
     except ffmpeg._run.Error as e:
+        stats.count('skipped_probe_error')
         print(str(e))
         return False
-    min_length = getattr(args, 'min_length', None)
-    max_length = getattr(args, 'max_length', None)
-    return not ((min_length and duration < min_length) or (max_length and duration > max_length))
+    with stats.stage('filter'):
+        if not is_playable(full_path, info):
+            stats.count('skipped_invalid')
+            return False
+        if not all(predicate(info) for predicate in filters):
+            stats.count('skipped_filter')
+            return False
+    stats.count('accepted')
+    return True
 
-def scan_directory(args):
-    playlist = []
-    for subdir, dirs, files in os.walk(args.dir):
+def sorted_walk(top):
+    # os.walk in name order, yielding (directory, file names): the playlist order never depends on the filesystem's
+    for subdir, dirs, files in os.walk(top):
+        dirs.sort()
+        yield subdir, sorted(files)
+
+def tree_fingerprint(top):
+    # Digest of every directory's path and mtime: adding, removing or renaming a file anywhere changes it,
+    # and only directories are stat'ed (a file rewritten in place keeps its directory's mtime)
+    digest = hashlib.sha1()
+    for subdir, _ in sorted_walk(top):
+        try:
+            mtime_ns = os.stat(subdir).st_mtime_ns
+        except OSError:
+            continue
+        digest.update(f"{os.path.relpath(subdir, top)}\0{mtime_ns}\n".encode('utf-8', 'surrogateescape'))
+    return digest.hexdigest()
+
+def iter_video_files(args, stats=None):
+    stats = stats if stats is not None else RunStats()
+    # A listing the caller already took in the same form and order (Manato's pre-scan) replaces the walk
+    listing = getattr(args, 'listing', None)
+    for subdir, files in listing if listing is not None else sorted_walk(args.dir):
+        stats.count('directories_seen')
         for file in files:
+            stats.count('files_seen')
             ext = file.split('.')[-1]
             if ext.lower() in VIDEO_EXTENSIONS:
-                full_path = os.path.join(subdir, file)
-                if not validate_length(args, full_path):
-                    continue
-                if getattr(args, 'portrait', False) or getattr(args, 'horz', False):
-                    probe = ffmpeg.probe(full_path)
-                    video_info = next((stream for stream in probe['streams'] if stream['codec_type'] == 'video'), None)
-                    width, height = int(video_info['width']), int(video_info['height'])
-                    if (args.portrait and width >= height) or (args.horz and height > width):
-                        continue
-                mount_path = subdir.replace(args.dir, args.mount)
-                playlist.append(os.path.join(mount_path, file))
+                yield os.path.join(subdir, file)
             else:
+                stats.count('skipped_extension')
                 print(f"File: {os.path.join(subdir, file)} is not a recognizable video format. Skipping...")
-    return playlist
+
+def dedupe_files(args, full_paths, stats=None):
+    """
+    Drop all but one copy of every set of identical files in full_paths (see Barcarolle_Dedupe.py), keeping
+    the one '-dedupe_keep' prefers. Needs the whole candidate list, but reads only size-colliding files and
+    runs before probing, so duplicates never cost an ffprobe. Returns the kept paths in input order.
+    """
+    stats = stats if stats is not None else RunStats()
+    full_paths = list(full_paths)
+    with stats.stage('dedupe'):
+        cache = open_hash_cache(args)
+        try:
+            kept, duplicates = find_duplicates(full_paths, getattr(args, 'dedupe_keep', None) or 'shortest',
+                                               getattr(args, 'prefer_root', None) or (), cache, stats.count)
+        finally:
+            if cache is not None:
+                cache.close()
+    for duplicate, original in duplicates.items():
+        print(f"File: {duplicate} is a duplicate of {original}. Skipping...")
+    stats.count('skipped_duplicate', len(duplicates))
+    return kept
+
+def dedupe_relative(args, relative_paths, stats=None):
+    # For lists already resolved to '/'-separated paths under args.dir (Manato's incremental snapshots)
+    full_paths = {os.path.join(args.dir, *relative_path.split('/')): relative_path for relative_path in relative_paths}
+    return [full_paths[full_path] for full_path in dedupe_files(args, full_paths, stats)]
+
+def dedupe_enabled(args):
+    return getattr(args, 'dedupe', 'no') == 'yes'
+
+def dedupe_settings(args):
+    # Everything a deduplicated listing depends on, as stored in a library's meta.json; None when '-dedupe' is off
+    if not dedupe_enabled(args):
+        return None
+    return [getattr(args, 'dedupe_keep', None) or 'shortest',
+            [os.path.abspath(root) for root in getattr(args, 'prefer_root', None) or ()]]
+
+def validate_length(args, full_path, cache=None, stats=None):
+    return accept_media(full_path, [f for f in (length_filter(args),) if f is not None], cache, select_probe(args), stats)
+
+def iter_probed(args, full_paths, stats=None, errors=None):
+    """
+    Probe full_paths (through the cache), yielding (full_path, MediaInfo) for every playable video in input order.
+    Paths whose probe failed (as opposed to files that are not playable videos) are added to the 'errors' set if given.
+    """
+    stats = stats if stats is not None else RunStats()
+    with stats.stage('cache'):
+        cache = open_probe_cache(args)
+    jobs = getattr(args, 'jobs', None) or 1
+    probe = stats.timed_probe(select_probe(args))
+    try:
+        for full_path, info, error in stats.timed_iter('probe', probe_files(full_paths, cache, jobs, probe)):
+            if error is not None:
+                stats.count('skipped_probe_error')
+                print(str(error))
+                if errors is not None:
+                    errors.add(full_path)
+                continue
+            with stats.stage('filter'):
+                playable = is_playable(full_path, info)
+            if not playable:
+                stats.count('skipped_invalid')
+                continue
+            yield full_path, info
+    finally:
+        if cache is not None:
+            stats.count('cache_hits', cache.hits)
+            with stats.stage('cache'):
+                cache.close()
+
+def iter_accepted_media(args, full_paths, stats=None, errors=None):
+    """Probe and filter full_paths, yielding (full_path, MediaInfo) for those that pass every filter, in input order."""
+    stats = stats if stats is not None else RunStats()
+    filters = build_filters(args)
+    for full_path, info in iter_probed(args, full_paths, stats, errors):
+        with stats.stage('filter'):
+            passed = all(predicate(info) for predicate in filters)
+        if not passed:
+            stats.count('skipped_filter')
+            continue
+        stats.count('accepted')
+        yield full_path, info
+
+def iter_accepted(args, full_paths, stats=None, errors=None):
+    for full_path, _ in iter_accepted_media(args, full_paths, stats, errors):
+        yield full_path
+
+def iter_relative_media(args, stats=None):
+    """
+    Yield (relative_path, duration) for the accepted videos under args.dir, with mount-neutral relative paths
+    ('/'-separated), as soon as each one is probed and filtered (or from the columnar library with '-library'),
+    so one scan can be rendered for any number of client mounts with render_entry.
+    """
+    stats = stats if stats is not None else RunStats()
+    if getattr(args, 'library', None):
+        # A '-dedupe' library had its duplicates dropped when it was built
+        yield from iter_library_media(args, stats)
+        return
+    full_paths = stats.timed_iter('walk', iter_video_files(args, stats))
+    if dedupe_enabled(args):
+        full_paths = dedupe_files(args, full_paths, stats)
+    for full_path, info in iter_accepted_media(args, full_paths, stats):
+        yield os.path.relpath(full_path, args.dir).replace(os.sep, '/'), info.duration
+
+def iter_relative(args, stats=None):
+    for relative_path, _ in iter_relative_media(args, stats):
+        yield relative_path
+
+def scan_relative(args, stats=None):
+    return list(iter_relative(args, stats))
+
+def open_library(args, stats=None):
+    """
+    Load the columnar library at args.library, (re)building it first from a full probe pass over args.dir
+    when it is missing, was built from another directory, is stale (its tree_fingerprint no longer matches
+    the tree's), was built with other '-dedupe' settings, or '-library_mode refresh' is set.
+    Only playable videos are stored, unfiltered, so any filter combination can be answered from it. With
+    '-dedupe' the duplicates are dropped from the walk before anything is probed.
+    """
+    stats = stats if stats is not None else RunStats()
+    root = os.path.abspath(args.dir)
+    library = MediaLibrary(args.library) if library_exists(args.library) else None
+    # Taken before any build walk, so changes made while building show up as stale next time
+    with stats.stage('library_check'):
+        fingerprint = tree_fingerprint(args.dir)
+    dedupe = dedupe_settings(args)
+    if library is not None and library.root == root and library.fingerprint != fingerprint:
+        print(f"Library {args.library} is out of date with {args.dir}. Rebuilding...")
+        library = None
+    elif library is not None and library.root == root and library.dedupe != dedupe:
+        print(f"Library {args.library} was built with other '-dedupe' settings. Rebuilding...")
+        library = None
+    if library is None or library.root != root or getattr(args, 'library_mode', 'use') == 'refresh':
+        def rows():
+            full_paths = stats.timed_iter('walk', iter_video_files(args, stats))
+            if dedupe is not None:
+                full_paths = dedupe_files(args, full_paths, stats)
+            for full_path, info in iter_probed(args, full_paths, stats):
+                yield (os.path.relpath(full_path, args.dir).replace(os.sep, '/'), info.duration, info.width,
+                       info.height, info.rotation, info.size, info.mtime)
+        with stats.stage('library_build'):
+            count = write_library(args.library, root, rows(), fingerprint, dedupe)
+        print(f"Library built with {count} videos: {args.library}")
+        library = MediaLibrary(args.library)
+    return library
+
+def iter_library_media(args, stats=None):
+    """
+    Like iter_relative_media, but answered from the columnar library: every filter with a vectorized twin in
+    LIBRARY_FILTERS becomes one boolean mask over the whole library, and any other registered filter is
+    applied row by row to the survivors.
+    """
+    stats = stats if stats is not None else RunStats()
+    library = open_library(args, stats)
+    with stats.stage('filter'):
+        active = {name: predicate for name, predicate in ((name, factory(args)) for name, factory in MEDIA_FILTERS.items())
+                  if predicate is not None}
+        indices = library.select(args, [name for name in active if name in LIBRARY_FILTERS])
+        row_filters = [predicate for name, predicate in active.items() if name not in LIBRARY_FILTERS]
+    stats.count('library_rows', len(library))
+    durations = library.columns['duration']
+    for index in indices:
+        if row_filters:
+            info = MediaInfo(has_video=True, codec=None, **library.row(index))
+            if not all(predicate(info) for predicate in row_filters):
+                continue
+        stats.count('accepted')
+        yield library.path(index), float(durations[index])
+
+def iter_library_relative(args, stats=None):
+    for relative_path, _ in iter_library_media(args, stats):
+        yield relative_path
+
+WINDOWS_OS_TYPES = ('win', 'windows')
+
+def is_windows_mount(mount):
+    return bool(re.match(r'^([A-Za-z]:|\\\\)', mount))
+
+def is_windows_target(os_type, mount):
+    # Backslash separators for a Windows client, named as such or recognised by a drive letter or UNC mount
+    return os_type in WINDOWS_OS_TYPES or is_windows_mount(mount)
+
+def render_entry(mount, relative_path, windows=False):
+    if windows:
+        return mount.rstrip('\\/') + '\\' + relative_path.replace('/', '\\')
+    return posixpath.join(mount, relative_path)
+
+def iter_playlist_media(args, stats=None):
+    windows = is_windows_target(getattr(args, 'os_type', None), args.mount)
+    for relative_path, duration in iter_relative_media(args, stats):
+        yield render_entry(args.mount, relative_path, windows), duration
+
+def iter_playlist(args, stats=None):
+    for entry, _ in iter_playlist_media(args, stats):
+        yield entry
+
+def scan_directory(args, stats=None):
+    return list(iter_playlist(args, stats))
 
 def generate_output_folder(args):
     if not os.path.exists(args.output):
@@ -118,44 +870,277 @@ def generate_output_folder(args):
 def generate_filters_flag(args):
     filters = ['shuffle' if getattr(args, 'shuffle', 'no') == 'yes' else '',
                'portrait' if getattr(args, 'portrait', False) else '',
-               'horz' if getattr(args, 'horz', False) else '']
+               'horz' if getattr(args, 'horz', False) else '',
+               'dedupe' if dedupe_enabled(args) else '']
     return "-".join(filter(None, filters)) or "nofilter"
     
-def create_7z_archive(output_folder, archive_name):
-    compression = {
-      "id": py7zr.FILTER_LZMA2,
-      "preset": 9  # LZMA2 maximum compression preset
-    }
-    with py7zr.SevenZipFile(archive_name, 'w', filters=[compression]) as archive:
-        for root, dirs, files in os.walk(output_folder):
-            for file in files:
-                file_path = os.path.join(root, file)
-                archive_path = os.path.relpath(file_path, output_folder)
-                archive.write(file_path, archive_path)
-    print(f".7z Archive created: {archive_name}")
+# Playlists are small text files: LZMA2 beyond the balanced preset costs far more CPU than it saves in bytes
+ARCHIVE_PRESETS = {
+    'store': [{'id': py7zr.FILTER_COPY}],
+    'fast': [{'id': py7zr.FILTER_LZMA2, 'preset': 1}],
+    'balanced': [{'id': py7zr.FILTER_LZMA2, 'preset': 5}],
+    'max': [{'id': py7zr.FILTER_LZMA2, 'preset': 9}],
+    'deflate': [{'id': py7zr.FILTER_DEFLATE}],
+    'bzip2': [{'id': py7zr.FILTER_BZIP2}],
+}
+DEFAULT_ARCHIVE_PRESET = 'balanced'
+
+def archive_inputs(output_folder):
+    # Existing .7z outputs and our hidden bookkeeping files (probe cache, temp playlists, archive state) are never archived
+    inputs = {}
+    for root, dirs, files in os.walk(output_folder):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        for file in files:
+            if file.startswith('.') or file.lower().endswith('.7z'):
+                continue
+            file_path = os.path.join(root, file)
+            stat = os.stat(file_path)
+            inputs[os.path.relpath(file_path, output_folder)] = [stat.st_size, stat.st_mtime_ns]
+    return inputs
+
+def archive_state_path(archive_name):
+    return os.path.join(os.path.dirname(archive_name), f".{os.path.basename(archive_name)}.state.json")
+
+def create_7z_archive(output_folder, archive_name, preset=DEFAULT_ARCHIVE_PRESET):
+    """
+    Archive output_folder into archive_name with one of ARCHIVE_PRESETS. A sidecar state file records what
+    went in, so an unchanged folder is skipped and files that were only added are appended to the archive.
+    Anything modified or removed rewrites the archive.
+    """
+    inputs = archive_inputs(output_folder)
+    state_path = archive_state_path(archive_name)
+    previous = {}
+    if os.path.exists(archive_name):
+        try:
+            with open(state_path, 'r') as f:
+                state = json.load(f)
+            if state.get('preset') == preset:
+                previous = state.get('files', {})
+        except (OSError, ValueError):
+            pass
+
+    if previous and previous == inputs:
+        print(f".7z Archive up to date: {archive_name}")
+        return
+    if previous and all(inputs.get(path) == entry for path, entry in previous.items()):
+        with py7zr.SevenZipFile(archive_name, 'a') as archive:
+            for archive_path in inputs.keys() - previous.keys():
+                archive.write(os.path.join(output_folder, archive_path), archive_path)
+        print(f".7z Archive updated: {archive_name}")
+    else:
+        temp_name = f"{archive_name}.{os.getpid()}.tmp"
+        with py7zr.SevenZipFile(temp_name, 'w', filters=ARCHIVE_PRESETS[preset]) as archive:
+            for archive_path in inputs:
+                archive.write(os.path.join(output_folder, archive_path), archive_path)
+        os.replace(temp_name, archive_name)
+        print(f".7z Archive created: {archive_name}")
+
+    with open(state_path, 'w') as f:
+        json.dump({'preset': preset, 'files': inputs}, f)
+
+class ArchiveWorker:
+    """
+    Runs create_7z_archive on one background thread, so compressing one output folder overlaps
+    with scanning the next. submit returns the archive's Future, whose result() re-raises its failure,
+    so the caller can hold back whatever depends on the archive until it has been written.
+    """
+
+    def __init__(self, preset=DEFAULT_ARCHIVE_PRESET):
+        self.preset = preset
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.futures = []
+
+    def submit(self, output_folder, archive_name, stats=None):
+        future = self.executor.submit(self._archive, output_folder, archive_name, stats)
+        self.futures.append(future)
+        return future
+
+    def _archive(self, output_folder, archive_name, stats):
+        start_wall, start_cpu = time.perf_counter(), time.thread_time()
+        try:
+            create_7z_archive(output_folder, archive_name, self.preset)
+        finally:
+            if stats is not None:
+                stats.add_stage('archive', time.perf_counter() - start_wall, time.thread_time() - start_cpu)
+
+    def wait(self):
+        for future in self.futures:
+            # Blocks without raising; the failure belongs to whoever holds the future
+            future.exception()
+        self.futures = []
+
+    def close(self):
+        self.wait()
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+PLAYLIST_BUFFER_BYTES = 1 << 20
+
+def write_playlist(output_file, entries, shuffle=False, rng=random):
+    """
+    Stream entries into a hidden temp file beside output_file and atomically rename it into place,
+    so readers only ever see a complete playlist and memory stays flat however many entries there are.
+    """
+    output_file = str(output_file)
+    temp_file = os.path.join(os.path.dirname(output_file), f".{os.path.basename(output_file)}.{os.getpid()}.tmp")
+    try:
+        with open(temp_file, 'x', buffering=PLAYLIST_BUFFER_BYTES) as f:
+            if shuffle:
+                write_shuffled(f, entries, rng)
+            else:
+                for vid_path in entries:
+                    f.write(f'{vid_path}\n')
+        os.replace(temp_file, output_file)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+    print(f"Playlist file has been successfully created at: {output_file}")
+
+def write_shuffled(f, entries, rng=random):
+    # Spool the entries to disk and shuffle 8-byte offsets instead of holding every path string in memory
+    offsets = array('Q')
+    position = 0
+    with tempfile.TemporaryFile(dir=os.path.dirname(f.name) or None) as spool:
+        for vid_path in entries:
+            line = f'{vid_path}\n'.encode('utf-8')
+            offsets.append(position)
+            spool.write(line)
+            position += len(line)
+        rng.shuffle(offsets)
+        for offset in offsets:
+            spool.seek(offset)
+            f.write(spool.readline().decode('utf-8'))
+
+def parse_duration(value):
+    # Plain seconds, or hours/minutes/seconds each with its suffix: '7200', '90m', '2h', '1h30m', '45m30s'.
+    # A bare number after a unit ('1h30') is ambiguous and rejected rather than read as seconds.
+    text = str(value).strip()
+    if re.fullmatch(r'\d+(?:\.\d+)?', text):
+        total = float(text)
+    else:
+        match = re.fullmatch(r'(?:(\d+(?:\.\d+)?)h)?\s*(?:(\d+(?:\.\d+)?)m)?\s*(?:(\d+(?:\.\d+)?)s)?', text)
+        if not match or not any(match.groups()):
+            raise argparse.ArgumentTypeError(f"Invalid duration: {value!r} (use e.g. 7200, 90m, 2h or 1h30m)")
+        hours, minutes, seconds = (float(group or 0) for group in match.groups())
+        total = hours * 3600 + minutes * 60 + seconds
+    if total <= 0:
+        raise argparse.ArgumentTypeError(f"Duration must be greater than zero: {value!r}")
+    return total
+
+def positive_int(value):
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid number: {value!r}")
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"Must be greater than zero: {value!r}")
+    return number
+
+def reservoir_sample(items, k, rng=random, keep_order=True):
+    """
+    Uniformly pick k items from an iterable of unknown length in one pass, holding only k of them
+    (Li's Algorithm L: random skip lengths instead of one random number per item). Returns them in
+    input order, or shuffled when keep_order is False.
+    """
+    iterator = enumerate(items)
+    reservoir = list(islice(iterator, k))
+    if k > 0 and len(reservoir) == k:
+        # 1.0 - random() lies in (0, 1], so the logarithms are always defined
+        weight = math.exp(math.log(1.0 - rng.random()) / k)
+        while weight < 1.0:
+            skip = math.floor(math.log(1.0 - rng.random()) / math.log(1.0 - weight))
+            picked = next(islice(iterator, skip, None), None)
+            if picked is None:
+                break
+            reservoir[rng.randrange(k)] = picked
+            weight *= math.exp(math.log(1.0 - rng.random()) / k)
+    if keep_order:
+        reservoir.sort(key=lambda pair: pair[0])
+    else:
+        rng.shuffle(reservoir)
+    return [item for _, item in reservoir]
+
+def duration_sample(items, budget, rng=random, keep_order=True):
+    """
+    Pick random (entry, duration) items until their durations reach 'budget' seconds, in one pass.
+    Each item gets a random key; the result is the shortest run of lowest keys whose durations reach the
+    budget, i.e. exactly what shuffling everything and filling the budget from the front would give, while
+    only those items are held (a max-heap on the key evicts any that the rest of the run no longer needs).
+    """
+    heap = []  # (-key, index, entry, duration): the largest key is on top
+    total = 0.0
+    for index, (entry, duration) in enumerate(items):
+        key = rng.random()
+        if total >= budget and key >= -heap[0][0]:
+            continue
+        heapq.heappush(heap, (-key, index, entry, duration))
+        total += duration
+        while total - heap[0][3] >= budget:
+            total -= heapq.heappop(heap)[3]
+    picked = sorted(heap, key=(lambda item: item[1]) if keep_order else (lambda item: -item[0]))
+    return [(entry, duration) for _, _, entry, duration in picked]
+
+def select_entries(args, entries, rng=random, stats=None):
+    """
+    Apply '-sample' or '-budget' to a stream of (entry, duration) pairs. Returns (entries, shuffle) where
+    shuffle tells write_playlist whether it still has to randomize the order itself.
+    """
+    stats = stats if stats is not None else RunStats()
+    shuffle = getattr(args, 'shuffle', 'no') == 'yes'
+    sample_size = getattr(args, 'sample', None)
+    budget = getattr(args, 'budget', None)
+    if sample_size is None and budget is None:
+        return (entry for entry, _ in entries), shuffle
+    with stats.stage('sample'):
+        if sample_size is not None:
+            picked = reservoir_sample(entries, sample_size, rng, keep_order=not shuffle)
+        else:
+            picked = duration_sample(entries, budget, rng, keep_order=not shuffle)
+    stats.count('sampled', len(picked))
+    print(f"Sampled {len(picked)} entries, {sum(duration for _, duration in picked) / 60:.1f} minutes in total.")
+    return (entry for entry, _ in picked), False
+
+def stats_file_for(output_file):
+    return f"{os.path.splitext(output_file)[0]}.stats.json"
 
 def main(args):
+    # Always collected; '-stats' only decides whether the report is printed and saved
+    stats = RunStats()
     generate_output_folder(args)
-    playlist = scan_directory(args)
     filter_string = generate_filters_flag(args)
-    
-    playlist_name = getattr(args, 'filename', f'playlist_{datetime.now().strftime("%Y%m%d%H%M%S")}.m3u8')
+
+    playlist_name = getattr(args, 'filename', None) or f'playlist_{datetime.now().strftime("%Y%m%d%H%M%S")}.m3u8'
     output_file = os.path.join(args.output, playlist_name)
-    
+
+    # Checked before scanning so a long walk is not wasted on an output we are not allowed to replace
     if os.path.exists(output_file) and not args.overwrite:
         print('File already exists, and overwrite is not set. Please change the name or set -overwrite flag.')
         sys.exit(1)
-    with open(output_file, 'w') as f:
-        for vid_path in playlist:
-            f.write(f'{vid_path}\n')
-    print(f"Playlist file has been successfully created at: {output_file}")
+    # A seed makes shuffling and sampling reproducible
+    seed = getattr(args, 'seed', None)
+    rng = random.Random(seed) if seed is not None else random
+    with stats.stage('write'):
+        entries, shuffle = select_entries(args, stats.timed_iter('scan', iter_playlist_media(args, stats)), rng, stats)
+        write_playlist(output_file, entries, shuffle=shuffle, rng=rng)
 
     if args.zip == 'yes':
         archive_name = f"{playlist_name.rsplit('.', 1)[0]}.7z"
         archive_path = os.path.join(args.output, archive_name)
-        create_7z_archive(args.output, archive_path)
+        with stats.stage('archive'):
+            create_7z_archive(args.output, archive_path, getattr(args, 'archive_preset', None) or DEFAULT_ARCHIVE_PRESET)
 
-if __name__ == '__main__':
+    stats.finish()
+    if getattr(args, 'stats', False):
+        stats.report(stats_file_for(output_file))
+    return stats
+
+def build_parser():
     parser = argparse.ArgumentParser(description="Process media files and create a playlist file with optional .7z archiving.")
     parser.add_argument('-dir', required=True, help="Directory containing media to process.")
     parser.add_argument('-mount', required=True, help="Root directory on client corresponding to -dir.")
@@ -169,10 +1154,41 @@ if __name__ == '__main__':
     parser.add_argument('-max_length', type=float, help="Include videos shorter than this value in seconds.")
     parser.add_argument('-filename', help="Specify a filename for the playlist file.")
     parser.add_argument('-zip', default='yes', help="Create a .7z compressed archive of output? 'yes' or 'no'.")
+    parser.add_argument('-archive_preset', default=DEFAULT_ARCHIVE_PRESET, choices=sorted(ARCHIVE_PRESETS), help="Compression preset for the .7z archive.")
+    sampling = parser.add_mutually_exclusive_group()
+    sampling.add_argument('-sample', type=positive_int, help="Keep this many randomly chosen matching videos.")
+    sampling.add_argument('-budget', type=parse_duration, help="Keep randomly chosen videos until their total runtime reaches this (e.g. 7200, 90m, 2h, 1h30m; not 1h30).")
+    parser.add_argument('-seed', type=int, help="Random seed for -shuffle, -sample and -budget.")
+    parser.add_argument('-stats', action='store_true', help="Print per-stage timings, counters and probe latencies, and save them as JSON next to the playlist.")
+    parser.add_argument('-jobs', type=int, default=os.cpu_count() or 1, help="Number of ffprobe processes to run at once.")
+    parser.add_argument('-header_probe', default='yes', help="Read MP4/MOV/MKV/WebM headers in-process instead of running ffprobe? 'yes' or 'no'.")
+    parser.add_argument('-probe_mode', default='lean', choices=['lean', 'full'], help="Ask ffprobe for only the fields used ('lean') or everything ('full').")
+    parser.add_argument('-probe_timeout', type=float, default=DEFAULT_PROBE_TIMEOUT, help="Seconds before an ffprobe run is killed and the file skipped (0: no limit).")
+    parser.add_argument('-cache', help=f"SQLite probe cache file (default: {PROBE_CACHE_FILENAME} in the output directory).")
+    parser.add_argument('-cache_mode', default='use', choices=['use', 'rebuild', 'off'], help="Use the probe cache, rebuild it from scratch, or bypass it.")
+    parser.add_argument('-cache_max_entries', type=int, default=1000000, help="Evict least recently seen cache entries beyond this count.")
+    parser.add_argument('-cache_max_age', type=float, default=30, help="Evict cache entries for files not seen for this many days.")
+    parser.add_argument('-min_aspect', type=float, help="Include videos whose displayed width/height is at least this value.")
+    parser.add_argument('-max_aspect', type=float, help="Include videos whose displayed width/height is at most this value.")
+    parser.add_argument('-resolution', nargs='+', choices=list(RESOLUTION_TIERS), help="Include only videos in these resolution tiers.")
+    parser.add_argument('-min_size', type=float, help="Include files of at least this many MiB.")
+    parser.add_argument('-max_size', type=float, help="Include files of at most this many MiB.")
+    parser.add_argument('-modified_since', type=since_timestamp, help="Include files modified on or after this ISO 8601 date or time.")
+    parser.add_argument('-library', help="Directory of the columnar metadata library to build once and filter from (needs NumPy).")
+    parser.add_argument('-library_mode', default='use', choices=['use', 'refresh'], help="Use the library (building it if missing or stale) or rebuild it.")
+    parser.add_argument('-dedupe', default='no', choices=['yes', 'no'], help="Keep only one copy of identical files? 'yes' or 'no'.")
+    parser.add_argument('-dedupe_keep', default='shortest', choices=KEEP_POLICIES, help="Which copy to keep: shortest path, newest, or under the first matching -prefer_root.")
+    parser.add_argument('-prefer_root', nargs='+', help="Directories whose copies '-dedupe_keep root' keeps, most preferred first.")
+    parser.add_argument('-server', help="Send this request to a running Barcarolle_Daemon.py on this Unix socket instead of scanning here.")
+    return parser
 
-    args = parser.parse_args()
-    arg_dict = vars(args)
-    main(arg_dict)
+if __name__ == '__main__':
+    args = build_parser().parse_args()
+    if args.server:
+        # Thin client: the daemon parses the same arguments and answers from its warm caches
+        from Barcarolle_Daemon import send_request
+        sys.exit(send_request(args.server, sys.argv[1:]))
+    main(args)
 
 
 """
@@ -181,8 +1197,13 @@ if __name__ == '__main__':
 - Use command line arguments to specify options (utilizes argparse). 
 - '-dir' specifies the directory to scan. It's mandatory and must be a valid path on file system.
 - '-mount' is the client's root directory equivalent to '-dir'. Mandatory field but no validation is enforced.
+  A drive-letter or UNC mount (e.g. 'Z:\\media', '\\\\nas\\media') renders entries with Windows path separators.
 - '-autoplst' (default 'no') determines if a playlist name should be auto-generated. Options are 'yes' and 'no'.
 - '-shuffle' (default 'no'), if set to 'yes', shuffles the playlist. Options are 'yes' and 'no'.
+  Entries are spooled to a temp file and only their offsets are shuffled, so memory stays bounded on huge trees.
+- The walk, probe, filter and write stages form one generator pipeline: entries are written as they are accepted
+  to a hidden temp file in the output directory, which is atomically renamed over the playlist once complete.
+  The tree is walked in name order, each directory's files before its subdirectories, so the playlist order is the same on every filesystem.
 - '-output' is required to specify an output directory for playlist file.
 - The '-overwrite' flag overwrites an existing file in the output directory if provided.
 - Including '-portrait' flag only includes videos with vertical orientation.
@@ -190,9 +1211,45 @@ if __name__ == '__main__':
 - Define '-min_length' in seconds to filter out videos shorter than this value.
 - Define '-max_length' in seconds to filter out videos longer than this value.
 - If provided, '-filename' allows to specify a filename for the playlist file.
+- '-archive_preset' picks the .7z codec/level: 'store', 'fast' (LZMA2 -1), 'balanced' (LZMA2 -5, default), 'max' (LZMA2 -9), 'deflate' or 'bzip2'.
+  Existing .7z files and hidden bookkeeping files are left out of the archive. A hidden '.<archive>.state.json' records what was
+  archived, so re-running on an unchanged folder skips compression and newly added files are appended instead of recompressing everything.
+- '-sample N' keeps N matching videos chosen uniformly at random in a single streaming pass (reservoir sampling, Algorithm L),
+  holding only N entries however large the library is. '-budget' (seconds, or '90m', '2h', '1h30m'; '1h30' is rejected, since
+  every number after the first needs its unit) keeps random videos until their probed durations reach the target, exactly as if
+  the whole list were shuffled and filled from the front, but only the picked entries are held. Both must be greater than zero
+  and keep walk order unless '-shuffle yes' is also given. '-seed' makes shuffling and sampling reproducible.
+- '-stats' prints a run report and saves it as '<playlist>.stats.json': exclusive wall/CPU time per stage (walk, probe, filter,
+  scan, write, archive, cache), counts of files seen, skipped for extension, probe error, invalid stream or filter, and accepted,
+  cache hits, and a histogram of probe latencies. The counters are always collected; the flag only controls the report.
+- '-jobs' sets how many ffprobe processes run at once (default: CPU count). The walker stays only a few files per job ahead of the probes and the playlist keeps walk order.
+- With '-header_probe yes' (default) MP4/MOV/M4V and MKV/WebM files are measured from their container headers by Barcarolle_Container_Headers.py, reading a few KB per file; other formats and files it cannot parse still go through ffprobe.
+- '-probe_mode lean' (default) runs ffprobe with '-select_streams v:0' and '-show_entries' limited to duration, codec, width, height and
+  rotation, printed as key=value lines, so files with many audio/subtitle tracks cost less in ffprobe and in parsing.
+  '-probe_mode full' keeps the complete ffmpeg.probe JSON. '-probe_timeout' (default 30 s, either mode) kills a hung ffprobe and skips the file.
+- ffprobe results are kept in a SQLite cache ('-cache', default '.barcarolle_probe_cache.sqlite' in the output directory) keyed by path, size and mtime, so repeat runs only probe new or modified files.
+- '-cache_mode rebuild' drops the cache and re-probes everything; '-cache_mode off' bypasses it entirely.
+- '-cache_max_entries' and '-cache_max_age' (days) bound the cache; entries for files not seen recently are evicted first.
+- '-server SOCKET' turns the script into a thin client: the same arguments are sent to a running Barcarolle_Daemon.py, which
+  answers from its in-memory probe cache and prints the same output. Relative paths are resolved in the client's working directory.
 - In addition to argument parsing, the script checks for the validity of the provided directory and the existence of files.
 - The dependencies are checked at runtime; if not there, script installs them via pip ('check_dependencies' function).
 - The 'scan_directory' function scans the provided directory for video files with specific extensions, filters based on length and orientation and creates the playlist.
+- Each file is probed exactly once into a 'MediaInfo' record (duration, width, height, rotation, codec). Filters are registered with '@media_filter' as factories returning a predicate over that record, so new criteria never add another ffprobe call.
+- Orientation honours the rotation flag, so phone footage stored landscape with a 90/270 degree rotation counts as portrait.
+- '-min_aspect'/'-max_aspect' bound the displayed width/height ratio, '-resolution' keeps the listed tiers (by the short side of the
+  frame: sd < 720, hd >= 720, fhd >= 1080, qhd >= 1440, uhd >= 2160), '-min_size'/'-max_size' are in MiB and '-modified_since' takes an
+  ISO 8601 date or time. Size and mtime come from stat, not ffprobe, so cached probes still see the current values.
+- '-library DIR' probes the whole tree once (through the probe cache) into a columnar store of NumPy arrays (duration, width, height,
+  rotation, size, mtime, path offsets plus one path blob) and answers every filter as a vectorized mask over it, so further playlists
+  with other filters take milliseconds instead of another probe pass. The library is rebuilt when missing, when it was built from
+  another '-dir', when a file was added, removed or renamed since (every directory's mtime is compared, no file is stat'ed), or with
+  '-library_mode refresh', which also catches files rewritten in place. NumPy is only imported when '-library' is used.
+- '-dedupe yes' keeps one copy of byte-identical files, before anything is probed. Files are grouped by size; only files sharing a size
+  have their first and last 64 KiB hashed (through mmap), and only those still colliding are hashed in full. Digests are stored in the
+  probe cache file ('hashes' table), so later runs read only new or modified files. '-dedupe_keep' picks the copy: 'shortest' path
+  (default), 'newest' mtime, or 'root' (the first copy under the earliest '-prefer_root'). The walk has to finish before probing starts.
+  With '-library' the duplicates are dropped while the library is built, and it is rebuilt when the '-dedupe' settings change.
 - 'generate_filters_flag' function sets up video selection flags based on user's preferences.
 - 'generate_output_folder' function creates the output folder if it doesn't exist.
 - 'main()' function operates the overall playlist generation process.
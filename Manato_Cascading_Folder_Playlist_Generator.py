@@ -8,7 +8,12 @@ Description
 1. PYTHON 3 script reads a YAML configuration file and generates m3u8 playlists based on each subdirectory.
 2. .m3u8 playlist files are generated for each subdirectory with names matching the parent directory.
 3. Also supports creating mounting points for playlist paths for Linux, MacOS, and Windows.
+   Each subdirectory is scanned once; the result is rendered for every entry in 'os_types'/'os_mounts'
+   ('win'/'windows' types and drive-letter or UNC mounts get backslash separators) as '<subdir>-<os_type>.m3u8'.
 4. Generates 7z archives of the output directory.
+   One '<output folder>.7z' per subdirectory once all its playlists are written ('zip_output'), compressed on a background
+   thread while the next subdirectory is scanned. A subdirectory whose archive fails is reported as failed. 'archive_preset' is 'store', 'fast', 'balanced' (default), 'max', 'deflate'
+   or 'bzip2'; existing .7z files are never re-archived and unchanged folders are not recompressed.
 5. Utilizes Barcarolle_Playlist_Generator functionality.
 
 ===============
@@ -24,33 +29,75 @@ Params
 |----------------------------|------------------------------------------------------------------|
 | '-config'                  | Path to the YAML configuration file                              |
 | '-generate_sample_config'  | Generate a sample YAML configuration file.                       |
+| '-incremental'             | Only regenerate subdirectories that changed since the last run.   |
+| '-stats'                   | Print per-stage timings/counters and save 'manato_stats.json'.    |
 
 Note: All filtering parameters are to be provided in the YAML configuration file. If the output directory is not provided, it will default to the script's directory.
+'jobs' sets how many ffprobe processes run at once while scanning a subdirectory.
+'header_probe' ('yes'/'no') reads MP4/MOV/MKV/WebM durations and sizes from container headers instead of ffprobe.
+'probe_mode' ('lean'/'full') and 'probe_timeout' (seconds) control how ffprobe itself is run.
+Besides 'min_length'/'max_length' and 'portrait_only'/'horz_only', 'min_aspect'/'max_aspect', 'resolution' (list of sd/hd/fhd/qhd/uhd),
+'min_size'/'max_size' (MiB) and 'modified_since' (ISO date) filter the playlists, as Barcarolle's flags of the same names do.
+'dedupe' ('yes'/'no'), 'dedupe_keep' and 'prefer_root' drop identical copies within each subdirectory, as Barcarolle's flags do.
+Incremental mode ('-incremental' or 'incremental: true') keeps a manifest ('.manato_manifest/' in 'output_dir', one file per
+subdirectory) of each subdirectory's tree fingerprint (directory mtimes, entry counts, video file sizes/mtimes). Unchanged subdirectories are skipped,
+changed ones only probe new or modified files and reuse their previous output folder, and a playlist is only rewritten
+(and re-archived) when its content digest changes. Changing any filter setting invalidates the manifest entries.
+Files whose probe failed (e.g. 'probe_timeout' during a storage stall) are not remembered as rejected; the next run probes them again.
+With '-stats' (or 'stats: true') the run's per-stage wall/CPU time, file counters and probe latency histogram are printed and
+written to 'manato_stats.json' in 'output_dir', totalled and broken down per subdirectory.
+'workers' (default 1) spreads subdirectories over that many processes, largest first by video count, so one giant
+subdirectory does not hold up the rest. The counts come from the incremental manifest, or else from listing each subdirectory
+up front, which that subdirectory's scan then reuses; with one worker nothing is listed ahead. 'probe_budget' caps how many
+ffprobe processes run at once across all workers (and 'jobs' threads), to spare the storage. A subdirectory that fails is
+reported and skipped; the others still run. Every run writes 'manato_summary.json' in 'output_dir' with each subdirectory's
+status (written, unchanged or failed), error, estimated file count, playlist entries ('accepted') and time taken.
+The ffprobe cache ('cache', 'cache_mode', 'cache_max_entries', 'cache_max_age') defaults to a file in 'output_dir', shared by every subdirectory and run.
 """
 
 import os
 import argparse
-import pkg_resources
+import hashlib
+import json
+import multiprocessing
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
+from importlib import metadata
 from pathlib import Path
 REQUIRED_PACKAGES = [
     'pyyaml',
     'py7zr'
 ]
 
+# importlib.metadata only looks up these distributions; pkg_resources scanned every installed one at import
 try:
-    pkg_resources.require(REQUIRED_PACKAGES)
-except pkg_resources.DistributionNotFound as e:
+    for package in REQUIRED_PACKAGES:
+        metadata.distribution(package)
+except metadata.PackageNotFoundError as e:
     print("Missing required package: ", e)
     print("Please install by running the command: pip install ", ' '.join(REQUIRED_PACKAGES))
     exit(1)
 
 import yaml
 from Barcarolle_Playlist_Generator import is_valid_file, validate_length, scan_directory, generate_output_folder, \
-    generate_filters_flag, main as barcarolle_main, VIDEO_EXTENSIONS
-import py7zr
+    generate_filters_flag, main as barcarolle_main, VIDEO_EXTENSIONS, PROBE_CACHE_FILENAME, is_windows_target, \
+    scan_relative, render_entry, write_playlist, iter_accepted, ArchiveWorker, DEFAULT_ARCHIVE_PRESET, \
+    create_7z_archive, RunStats, limit_probes, ProbeCache, dedupe_enabled, dedupe_relative
 
-def main(config_file):
+MANIFEST_DIRNAME = '.manato_manifest'
+STATS_FILENAME = 'manato_stats.json'
+SUMMARY_FILENAME = 'manato_summary.json'
+
+# Config keys that change how a run is carried out but not which files end up in a playlist
+OPERATIONAL_KEYS = {'dirs', 'output_dir', 'incremental', 'jobs', 'header_probe', 'probe_mode', 'probe_timeout',
+                    'cache', 'cache_mode', 'cache_max_entries', 'cache_max_age', 'zip_output', 'archive_preset',
+                    'auto_gen_playlist', 'stats', 'workers', 'probe_budget'}
+
+def main(config_file, incremental=False, stats=False):
     # Load parameters from YAML configuration file
     with open(config_file, 'r') as f:
         try:
@@ -60,42 +107,352 @@ def main(config_file):
             if 'output_dir' not in config or not config['output_dir']:
                 config['output_dir'] = os.getcwd()
 
-            # Run the barcarolle script to generate a playlist for each subdirectory
-            for directory in config['dirs']:
-                for subdir in os.scandir(directory):
-                    if subdir.is_dir():
-                        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-                        config['dir'] = subdir.path
-                        output_folder = Path(config['output_dir'], subdir.name + '-' + timestamp)     # Appending time stamp to output folder
-                        config['output'] = output_folder
-                        # Checks and creates output directories if they don't exist
-                        os.makedirs(output_folder, exist_ok=True)
-
-                        for os_type, os_mount in zip(config['os_types'], config['os_mounts']):
-                            config['mount'] = os_mount
-                            
-                            # Defaulting fields if they are missing in config
-                            config['portrait_only'] = config.get('portrait_only', False)
-                            config['horz_only'] = config.get('horz_only', False)
-                            config['min_length'] = config.get('min_length', None)
-                            config['max_length'] = config.get('max_length', None)
-                            config['shuffle_playlist'] = config.get('shuffle_playlist', 'no')  # defaulting to 'no' if missing
-                            config_namespace = argparse.Namespace(**config)
-
-                        
-                            barcarolle_main(config_namespace)  # instead of barcarolle_main(config)
-
-                            archive_name = f"{subdir.name}-{os_type}-{timestamp}.7z"
-                            archive_path = os.path.join(config['output_folder'], archive_name)
-
-                            # Archive creation
-                            with py7zr.SevenZipFile(archive_path, mode='w') as archive:
-                                archive.writeall(config['output_folder'], arcname="/")
-                            print(f".7z Archive created: {archive_path}")
+            # Keep the probe cache beside the timestamped output folders so it survives between runs
+            if not config.get('cache'):
+                config['cache'] = os.path.join(config['output_dir'], PROBE_CACHE_FILENAME)
+            # Rebuild once up front; every subdirectory (and worker process) then shares the fresh cache
+            if config.get('cache_mode') == 'rebuild':
+                ProbeCache(config['cache'], rebuild=True).close()
+                config['cache_mode'] = 'use'
+
+            incremental = incremental or config.get('incremental', False)
+            manifest_path = os.path.join(config['output_dir'], MANIFEST_DIRNAME)
+            manifest = load_manifest(manifest_path) if incremental else {}
+
+            run_stats = RunStats()
+            subdirs = [(os.path.abspath(subdir.path), subdir.path, subdir.name)
+                       for directory in config['dirs'] for subdir in os.scandir(directory) if subdir.is_dir()]
+            results = run_subdirectories(config, subdirs, manifest, incremental, manifest_path)
+
+            write_summary(os.path.join(config['output_dir'], SUMMARY_FILENAME), results)
+            subdir_stats = {key: result['stats'] for key, result in results.items() if result['stats'] is not None}
+            for stats_for_subdir in subdir_stats.values():
+                run_stats.merge(stats_for_subdir)
+            run_stats.finish()
+            if stats or config.get('stats', False):
+                write_run_stats(os.path.join(config['output_dir'], STATS_FILENAME), run_stats, subdir_stats)
 
         except yaml.YAMLError as err:
             print(err)
 
+def run_subdirectories(config, subdirs, manifest, incremental, manifest_path):
+    """
+    Process every (key, path, name) in subdirs. With 'workers' > 1 they are spread over a process pool, largest
+    first by video count (from the manifest, or a pre-scan whose listing the subdirectory then reuses instead of
+    walking again); otherwise they run here in order, archiving on a background thread while the next one is
+    scanned. 'probe_budget' caps the ffprobe processes running at once across all of them.
+    A failing subdirectory is recorded and the rest carry on. Each one's manifest entry is saved as it finishes,
+    including its archive, so a folder whose archive failed is redone by the next incremental run.
+    Returns {key: result} in completion order, as built by run_subdirectory.
+    """
+    workers = config.get('workers') or 1
+    probe_budget = config.get('probe_budget')
+    snapshots = {}
+    estimates = {key: len(manifest[key]['files']) if 'files' in (manifest.get(key) or {}) else None
+                 for key, _, _ in subdirs}
+    if workers > 1:
+        # Largest-first ordering only pays off with a pool; without a manifest entry that means listing the tree now
+        for key, path, _ in subdirs:
+            if estimates[key] is None:
+                snapshots[key] = snapshot_tree(path)
+                estimates[key] = len(snapshots[key][1])
+        subdirs = sorted(subdirs, key=lambda subdir: estimates[subdir[0]], reverse=True)
+    results = {}
+
+    def record(key, result):
+        archive = result.pop('archive', None)
+        error = archive.exception() if archive is not None else None
+        if error is not None:
+            result.update(status='failed', error=f"Archive failed: {type(error).__name__}: {error}")
+        result['estimated_files'] = estimates[key]
+        results[key] = result
+        if result['status'] == 'failed':
+            print(f"Failed to process {key}:\n{result['error']}")
+        elif incremental and result['state'] is not None and result['state'] != manifest.get(key):
+            manifest[key] = result['state']
+            save_manifest_entry(manifest_path, key, result['state'])
+
+    if workers <= 1:
+        limit_probes(threading.BoundedSemaphore(probe_budget) if probe_budget else None)
+        try:
+            # Archives compress on a background thread while the next subdirectory is scanned; a subdirectory
+            # is only recorded once its archive is done, so a failed one is never saved as written
+            with ArchiveWorker(config.get('archive_preset') or DEFAULT_ARCHIVE_PRESET) as archiver:
+                archiving = deque()
+                for key, path, name in subdirs:
+                    archiving.append((key, run_subdirectory(config, path, name, manifest.get(key), incremental, archiver)))
+                    while archiving and (archiving[0][1]['archive'] is None or archiving[0][1]['archive'].done()):
+                        record(*archiving.popleft())
+                while archiving:
+                    record(*archiving.popleft())
+        finally:
+            limit_probes(None)
+        return results
+
+    probe_slots = multiprocessing.BoundedSemaphore(probe_budget) if probe_budget else None
+    with ProcessPoolExecutor(max_workers=workers, initializer=limit_probes, initargs=(probe_slots,)) as executor:
+        # The pool starts tasks in submission order, so the largest subdirectories begin first
+        futures = {executor.submit(run_subdirectory, config, path, name, manifest.get(key), incremental, None,
+                                   snapshots.pop(key, None)): key
+                   for key, path, name in subdirs}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # Only reached when the worker process itself died; run_subdirectory catches everything else
+                result = {'status': 'failed', 'error': f"{type(e).__name__}: {e}", 'state': None, 'stats': None,
+                          'seconds': None}
+            record(futures[future], result)
+    return results
+
+def run_subdirectory(config, subdir_path, subdir_name, previous=None, incremental=False, archiver=None, snapshot=None):
+    """
+    Run process_subdirectory, turning any exception into a 'failed' result instead of stopping the cascade.
+    'archive' is the Future of the archive queued on 'archiver', if any; it is still running when this returns.
+    """
+    stats = RunStats()
+    start = time.perf_counter()
+    try:
+        with stats.stage('subdirectory'):
+            state, archive = process_subdirectory(config, subdir_path, subdir_name, previous, incremental, archiver,
+                                                  stats, snapshot)
+    except Exception:
+        return {'status': 'failed', 'error': traceback.format_exc(), 'state': None, 'stats': stats.finish(),
+                'seconds': round(time.perf_counter() - start, 3), 'archive': None}
+    status = 'unchanged' if stats.counters['subdirectories_unchanged'] else 'written'
+    return {'status': status, 'error': None, 'state': state, 'stats': stats.finish(),
+            'seconds': round(time.perf_counter() - start, 3), 'archive': archive}
+
+def write_summary(summary_file, results):
+    summary = {key: {name: value for name, value in result.items() if name not in ('state', 'stats')}
+               for key, result in results.items()}
+    for key, result in summary.items():
+        # Entries in the final playlist, including files accepted on earlier incremental runs
+        result['accepted'] = results[key]['stats'].counters['playlist_entries'] if results[key]['stats'] is not None else None
+    with open(summary_file, 'w') as f:
+        json.dump(summary, f, indent=2)
+    print("\n{:<60} {:<10} {:>10} {:>10}".format("Subdirectory", "Status", "Files", "Seconds"))
+    for key, result in summary.items():
+        print("{:<60} {:<10} {:>10} {:>10}".format(key, result['status'],
+                                                   result['estimated_files'] if result['estimated_files'] is not None else '-',
+                                                   result['seconds'] if result['seconds'] is not None else '-'))
+    failed = sum(1 for result in summary.values() if result['status'] == 'failed')
+    print(f"{len(summary)} subdirectories, {failed} failed. Summary written to: {summary_file}")
+
+def process_subdirectory(config, subdir_path, subdir_name, previous=None, incremental=False, archiver=None, stats=None,
+                         snapshot=None):
+    """
+    Scan one subdirectory once and write a playlist per OS mount into its output folder. 'snapshot' is a
+    snapshot_tree result already taken for this subdirectory, used instead of listing the tree again.
+    In incremental mode, 'previous' is the subdirectory's manifest entry from the last run: an unchanged
+    tree is skipped outright, otherwise only new or modified files are probed and only playlists whose
+    content digest changed are rewritten. When anything was written, the output folder is archived once
+    (on 'archiver' if given). Returns the new manifest entry (or 'previous' when unchanged) and the Future of
+    the archive queued on 'archiver', or None.
+    """
+    stats = stats if stats is not None else RunStats()
+    settings = settings_digest(config)
+    if incremental:
+        with stats.stage('snapshot'):
+            fingerprint, files, _ = snapshot if snapshot is not None else snapshot_tree(subdir_path)
+        if previous and previous['settings'] == settings and previous['fingerprint'] == fingerprint \
+                and os.path.isdir(previous['output_folder']):
+            print(f"No changes in {subdir_path}. Skipping...")
+            stats.count('subdirectories_unchanged')
+            stats.count('playlist_entries', previous['entries'])
+            return previous, None
+
+    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    if incremental and previous and os.path.isdir(previous['output_folder']):
+        output_folder = Path(previous['output_folder'])
+    else:
+        output_folder = Path(config['output_dir'], subdir_name + '-' + timestamp)     # Appending time stamp to output folder
+    # Checks and creates output directories if they don't exist
+    os.makedirs(output_folder, exist_ok=True)
+
+    scan_args = build_scan_args(config, subdir_path, output_folder)
+    if incremental:
+        candidates = list(files)
+        if dedupe_enabled(scan_args):
+            # Before probing, and over the whole listing every run: kept copies change as files come and go
+            # (digests are cached). Duplicates stay out of the manifest, so one kept later is probed then.
+            candidates = dedupe_relative(scan_args, candidates, stats)
+        known = previous['files'] if previous and previous['settings'] == settings else {}
+        accepted = {}
+        changed = []
+        for relative_path in candidates:
+            size, mtime_ns = files[relative_path]
+            entry = known.get(relative_path)
+            # None marks a file whose probe failed last time; it is probed again rather than trusted
+            if entry and entry[0] == size and entry[1] == mtime_ns and entry[2] is not None:
+                accepted[relative_path] = entry[2]
+            else:
+                changed.append(relative_path)
+        print(f"{subdir_path}: {len(changed)} new or modified of {len(files)} video files.")
+        stats.count('files_seen', len(files))
+        stats.count('files_unchanged', len(candidates) - len(changed))
+        probe_errors = set()
+        newly_accepted = {os.path.relpath(full_path, subdir_path).replace(os.sep, '/') for full_path in
+                          iter_accepted(scan_args, (os.path.join(subdir_path, *relative_path.split('/'))
+                                                    for relative_path in changed), stats, probe_errors)}
+        probe_errors = {os.path.relpath(full_path, subdir_path).replace(os.sep, '/') for full_path in probe_errors}
+        for relative_path in changed:
+            accepted[relative_path] = None if relative_path in probe_errors else relative_path in newly_accepted
+        relative_paths = [relative_path for relative_path in candidates if accepted[relative_path]]
+    else:
+        if snapshot is not None:
+            scan_args.listing = snapshot[2]
+        relative_paths = scan_relative(scan_args, stats)
+
+    stats.count('playlist_entries', len(relative_paths))
+    digests = {}
+    written = False
+    previous_digests = previous['digests'] if incremental and previous and previous['settings'] == settings else {}
+    for os_type, os_mount in zip(config['os_types'], config['os_mounts']):
+        windows = is_windows_target(os_type, os_mount)
+        playlist_file = Path(output_folder, f"{subdir_name}-{os_type}.m3u8")
+        digests[os_type] = playlist_digest(os_mount, relative_paths, windows)
+        if previous_digests.get(os_type) == digests[os_type] and playlist_file.exists():
+            print(f"Playlist unchanged: {playlist_file}")
+            continue
+        with stats.stage('write'):
+            write_playlist(playlist_file, (render_entry(os_mount, relative_path, windows)
+                                           for relative_path in relative_paths),
+                           shuffle=config.get('shuffle_playlist', 'no') == 'yes')
+        stats.count('playlists_written')
+        written = True
+
+    # One archive per output folder, named after it so incremental runs update it in place
+    archive = None
+    if written and config.get('zip_output', 'yes') == 'yes':
+        archive_path = os.path.join(output_folder, f"{output_folder.name}.7z")
+        if archiver is not None:
+            archive = archiver.submit(output_folder, archive_path, stats)
+        else:
+            with stats.stage('archive'):
+                create_7z_archive(output_folder, archive_path, config.get('archive_preset') or DEFAULT_ARCHIVE_PRESET)
+
+    if not incremental:
+        return None, archive
+    # A failed probe (e.g. a timeout during a storage stall) may succeed next time, so the
+    # fingerprint is withheld to keep the next run from skipping this subdirectory outright
+    retry = any(accepted[relative_path] is None for relative_path in candidates)
+    return {
+        'settings': settings,
+        'fingerprint': None if retry else fingerprint,
+        'files': {relative_path: [*files[relative_path], accepted[relative_path]] for relative_path in candidates},
+        'output_folder': str(output_folder),
+        'digests': digests,
+        'entries': len(relative_paths),
+    }, archive
+
+def write_run_stats(stats_file, run_stats, subdir_stats):
+    report = run_stats.report(title="Manato run statistics")
+    report['subdirectories'] = {key: stats_for_subdir.to_dict() for key, stats_for_subdir in subdir_stats.items()}
+    with open(stats_file, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Statistics written to: {stats_file}")
+
+def snapshot_tree(root):
+    """
+    Stat every directory and video file under root without probing anything.
+    Returns a fingerprint over directory mtimes, entry counts and file sizes/mtimes, a {relative_path: (size, mtime_ns)}
+    map of the video files, and the [(directory, file names)] listing, all in Barcarolle's sorted_walk order. The
+    listing covers every file, video or not, so Barcarolle can scan it ('listing') exactly as it would the tree.
+    """
+    digest = hashlib.sha1()
+    files = {}
+    listing = []
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+            directory_mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            continue
+        relative_dir = os.path.relpath(directory, root).replace(os.sep, '/')
+        digest.update(f"D{relative_dir}\0{directory_mtime}\0{len(entries)}\n".encode('utf-8', 'surrogateescape'))
+        subdirs = []
+        names = []
+        listing.append((directory, names))
+        for entry in entries:
+            try:
+                # Like os.walk: symlinks to directories are neither files nor followed
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        subdirs.append(entry.path)
+                    continue
+                names.append(entry.name)
+                if entry.name.split('.')[-1].lower() not in VIDEO_EXTENSIONS:
+                    continue
+                stat = entry.stat()
+            except OSError:
+                continue
+            relative_path = entry.name if relative_dir == '.' else f"{relative_dir}/{entry.name}"
+            files[relative_path] = (stat.st_size, stat.st_mtime_ns)
+            digest.update(f"F{relative_path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8', 'surrogateescape'))
+        stack.extend(reversed(subdirs))
+    return digest.hexdigest(), files, listing
+
+def settings_digest(config):
+    settings = {key: value for key, value in config.items() if key not in OPERATIONAL_KEYS}
+    return hashlib.sha1(json.dumps(settings, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def playlist_digest(mount, relative_paths, windows=False):
+    digest = hashlib.sha1()
+    for relative_path in relative_paths:
+        digest.update(f"{render_entry(mount, relative_path, windows)}\n".encode('utf-8', 'surrogateescape'))
+    return digest.hexdigest()
+
+def read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def manifest_entry_path(manifest_dir, key):
+    return os.path.join(manifest_dir, hashlib.sha1(key.encode('utf-8', 'surrogateescape')).hexdigest() + '.json')
+
+def load_manifest(manifest_dir):
+    # One {'key', 'state'} file per subdirectory, so finishing one never rewrites the others
+    manifest = {}
+    try:
+        names = os.listdir(manifest_dir)
+    except OSError:
+        return manifest
+    for name in names:
+        if not name.endswith('.json'):
+            continue
+        entry = read_json(os.path.join(manifest_dir, name))
+        if isinstance(entry, dict) and 'key' in entry and 'state' in entry:
+            manifest[entry['key']] = entry['state']
+    return manifest
+
+def save_manifest_entry(manifest_dir, key, state):
+    os.makedirs(manifest_dir, exist_ok=True)
+    entry_path = manifest_entry_path(manifest_dir, key)
+    temp_path = f"{entry_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump({'key': key, 'state': state}, f)
+    os.replace(temp_path, entry_path)
+
+def build_scan_args(config, directory, output_folder):
+    # Map the YAML keys onto the argument names Barcarolle's scanner reads; other keys pass through
+    scan_args = dict(config)
+    scan_args.update({
+        'dir': directory,
+        'mount': '',
+        'output': str(output_folder),
+        'portrait': config.get('portrait_only', False),
+        'horz': config.get('horz_only', False),
+        'min_length': config.get('min_length', None),
+        'max_length': config.get('max_length', None),
+        'shuffle': config.get('shuffle_playlist', 'no'),
+    })
+    return argparse.Namespace(**scan_args)
 
 def generate_sample_yaml_file(config_file):
     # Generate a sample YAML configuration file with default values
@@ -112,9 +469,28 @@ def generate_sample_yaml_file(config_file):
             'shuffle_playlist': 'yes',
             'portrait_only': False,
             'horz_only': False,
-            'zip_output': 'yes'
-            
-        
+            'min_aspect': None,
+            'max_aspect': None,
+            'resolution': None,
+            'min_size': None,
+            'max_size': None,
+            'modified_since': None,
+            'dedupe': 'no',
+            'dedupe_keep': 'shortest',
+            'prefer_root': None,
+            'zip_output': 'yes',
+            'archive_preset': 'balanced',
+            'jobs': 8,
+            'header_probe': 'yes',
+            'probe_mode': 'lean',
+            'probe_timeout': 30,
+            'cache_mode': 'use',
+            'cache_max_entries': 1000000,
+            'cache_max_age': 30,
+            'incremental': False,
+            'stats': False,
+            'workers': 1,
+            'probe_budget': None
         }
 
         with open(config_file, 'w') as outfile:
@@ -136,10 +512,12 @@ if __name__ == '__main__':
     group = parser.add_mutually_exclusive_group()
     group.add_argument('-config', dest="config_file", type=lambda x: is_valid_file(parser, x), help="Path to the YAML configuration file (required).")
     group.add_argument('-generate_sample_config', dest="sample_config_file", nargs='?', const='Manato_Cascading_Folder_Playlist_Generator.config.yaml', help="Generate a sample YAML configuration file.")
+    parser.add_argument('-incremental', action='store_true', help="Only regenerate subdirectories that changed since the last run.")
+    parser.add_argument('-stats', action='store_true', help="Print per-stage timings and counters and save them to manato_stats.json in output_dir.")
     args = parser.parse_args()
 
     if args.config_file:
         print("Running main function...")
-        main(args.config_file)
+        main(args.config_file, incremental=args.incremental, stats=args.stats)
     else:
         generate_sample_yaml_file(args.sample_config_file if args.sample_config_file else 'Manato_Cascading_Folder_Playlist_Generator.config.yaml')
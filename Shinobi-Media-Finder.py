@@ -10,6 +10,9 @@ python Shinobi-Media-Finder.py -t /path/to/media
 To perform a specific type search within a directory (videos, images, documents, audios):
 python Shinobi-Media-Finder.py -t /path/to/media -m
 
+To keep a persistent catalog so later runs only re-list changed directories, and report bytes as well as counts:
+python Shinobi-Media-Finder.py -t /path/to/media -c /path/to/shinobi_catalog.sqlite
+
 Replace the placeholder paths with the actual paths on your system where appropriate.
 
 Parameters Table:
@@ -21,16 +24,28 @@ Parameters Table:
 | -p    | --picture | None (optional) | -       | Look for picture files only.                         |
 | -d    | --document| None (optional) | -       | Look for document files only.                        |
 | -s    | --sound   | None (optional) | -       | Look for sound/audio files only.                     |
+| -w    | --workers | int (optional) | 4/core  | Number of directory-listing threads (max 32 default).|
+| -c    | --catalog | str (optional) | -       | SQLite catalog reused between runs; adds byte totals.|
 
 If none of the optional parameters (-m, -p, -d, -s) are used, the script defaults to looking for all media types.
 
 To keep the code lightweight, only one of the optional parameters is allowed at a time.
+
+The tree is listed by a pool of work-stealing os.scandir threads ('-w'), which keeps many directory
+requests in flight on NFS/SMB mounts. Extensions are matched case-insensitively ('.MP4' counts as 'mp4').
+
+With '-c' every file's path, extension, size and mtime is kept in a SQLite catalog. Later runs stat each
+directory and only re-list those whose mtime changed; counts and bytes per extension and per media type are
+then answered from the catalog. Directories that disappeared are dropped from it. A file rewritten in place
+does not change its directory's mtime, so its size is refreshed the next time that directory changes.
 """
 
 import os
 import argparse
-from concurrent.futures import ThreadPoolExecutor
+import sqlite3
+import threading
 import time
+from collections import Counter, deque
 
 # Supported file extensions
 VIDEO_EXTENSIONS = ['mp4', 'avi', 'mov', 'mkv', 'flv', 'wmv', 'm4v', 'webm', '3gp', 'ogv', 'mpg', 'mpeg', 'm2v', 'm4p', 'm4v', 'mp2', 'mpe', 'mpv', 'm2ts', 'mxf', 'yuv', 'rm', 'asf', 'vob', 'amv', 'rmvb', 'drc', 'gifv', 'mts', 'm2ts', 'qt', 'svi', '3g2', 'roq', 'nsv', 'f4v', 'f4p', 'f4a', 'f4b']
@@ -44,15 +59,223 @@ def is_valid_dir(parser, arg):
     else:
         return arg
 
-def search_files(path, file_extensions):
+def default_workers():
+    # Directory listing is latency-bound (especially on NFS/SMB), so use more threads than cores
+    return min(32, (os.cpu_count() or 1) * 4)
+
+def walk_tree(path, visit, workers=None):
+    """
+    Call visit(directory, worker_index) for every directory under path, on a pool of work-stealing threads.
+    visit returns the subdirectories to descend into. Each worker takes directories from its own deque
+    (depth first) and steals the oldest queued directory from another worker when it runs dry.
+    If visit raises, the workers stop and the first exception is re-raised once they have all finished.
+    """
+    workers = workers or default_workers()
+    queues = [deque() for _ in range(workers)]
+    queues[0].append(path)
+    pending = [1]  # directories queued or being visited
+    errors = []
+    state = threading.Condition()
+
+    def take(index):
+        try:
+            return queues[index].pop()
+        except IndexError:
+            pass
+        for offset in range(1, workers):
+            try:
+                return queues[(index + offset) % workers].popleft()
+            except IndexError:
+                continue
+        return None
+
+    def work(index):
+        while not errors:
+            directory = take(index)
+            if directory is None:
+                with state:
+                    if pending[0] == 0:
+                        return
+                    state.wait(0.05)
+                continue
+            subdirs = []
+            try:
+                subdirs = visit(directory, index)
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                with state:
+                    # Queue the children before retiring this directory so pending never drops to zero early
+                    pending[0] += len(subdirs) - 1
+                    queues[index].extend(subdirs)
+                    if subdirs or pending[0] == 0 or errors:
+                        state.notify_all()
+
+    threads = [threading.Thread(target=work, args=(index,), daemon=True) for index in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+def list_directory(directory, on_file):
+    # Subdirectories (not following symlinks) are returned; every other entry goes to on_file
+    subdirs = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            subdirs.append(entry.path)
+                        continue
+                except OSError:
+                    continue
+                on_file(entry)
+    except OSError:
+        pass
+    return subdirs
+
+def search_files(path, file_extensions, workers=None):
+    """
+    Count files per extension under path with walk_tree's pool of os.scandir workers.
+    Extensions are matched case-insensitively through a frozenset and counted per worker,
+    then merged once at the end.
+    """
+    extension_index = frozenset(ext.lower() for ext in file_extensions)
+    workers = workers or default_workers()
+    worker_counts = [Counter() for _ in range(workers)]
+
+    def visit(directory, index):
+        counts = worker_counts[index]
+
+        def on_file(entry):
+            ext = entry.name.split('.')[-1].lower()
+            if ext in extension_index:
+                counts[ext] += 1
+        return list_directory(directory, on_file)
+
+    walk_tree(path, visit, workers)
+
     file_counts = {ext: 0 for ext in file_extensions}
-    for subdir, dirs, files in os.walk(path):
-        for file in files:
-            ext = file.split('.')[-1]
-            if ext in file_extensions:
-                file_counts[ext] += 1
+    for counts in worker_counts:
+        for ext, count in counts.items():
+            file_counts[ext] = file_counts.get(ext, 0) + count
     return file_counts
 
+class FileCatalog:
+    """
+    SQLite catalog of every file under the directories searched so far: path, extension, size and mtime,
+    plus each directory's mtime and parent so unchanged subtrees can be walked without listing them.
+    """
+    SCHEMA_VERSION = 1
+
+    def __init__(self, db_path):
+        self.db = sqlite3.connect(db_path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        if self.db.execute('PRAGMA user_version').fetchone()[0] != self.SCHEMA_VERSION:
+            self.db.executescript(f"""
+                DROP TABLE IF EXISTS directories;
+                DROP TABLE IF EXISTS files;
+                CREATE TABLE directories (path TEXT PRIMARY KEY, parent TEXT, mtime_ns INTEGER);
+                CREATE TABLE files (directory TEXT, name TEXT, ext TEXT, size INTEGER, mtime_ns INTEGER,
+                                    PRIMARY KEY (directory, name));
+                PRAGMA user_version = {self.SCHEMA_VERSION};
+            """)
+            self.db.commit()
+
+    @staticmethod
+    def _subtree(root):
+        # The root itself, or anything that sorts between 'root/' and 'root0' ('0' follows '/')
+        prefix = root.rstrip(os.sep) + os.sep
+        return '(path = ? OR (path >= ? AND path < ?))', (root, prefix, prefix[:-1] + chr(ord(os.sep) + 1))
+
+    def load_directories(self, root):
+        """Return {directory: (mtime_ns, [subdirectories])} for the catalogued tree under root."""
+        where, params = self._subtree(root)
+        rows = self.db.execute(f'SELECT path, parent, mtime_ns FROM directories WHERE {where}', params).fetchall()
+        known = {path: (mtime_ns, []) for path, _, mtime_ns in rows}
+        for path, parent, _ in rows:
+            if parent in known and path != root:
+                known[parent][1].append(path)
+        return known
+
+    def update(self, root, listings, visited, known):
+        """
+        Store the fresh listings ({directory: (mtime_ns, [(name, ext, size, mtime_ns)])}) and drop
+        every catalogued directory under root that was not visited this time.
+        """
+        with self.db:
+            for directory, (mtime_ns, files) in listings.items():
+                self.db.execute('INSERT OR REPLACE INTO directories VALUES (?, ?, ?)',
+                                (directory, os.path.dirname(directory), mtime_ns))
+                self.db.execute('DELETE FROM files WHERE directory = ?', (directory,))
+                self.db.executemany('INSERT INTO files VALUES (?, ?, ?, ?, ?)',
+                                    ((directory,) + file for file in files))
+            for directory in known.keys() - visited:
+                self.db.execute('DELETE FROM directories WHERE path = ?', (directory,))
+                self.db.execute('DELETE FROM files WHERE directory = ?', (directory,))
+
+    def totals(self, root):
+        """Return {ext: (count, bytes)} for every file catalogued under root."""
+        where, params = self._subtree(root)
+        where = where.replace('path', 'directory')
+        return {ext: (count, size or 0) for ext, count, size in self.db.execute(
+            f'SELECT ext, COUNT(*), SUM(size) FROM files WHERE {where} GROUP BY ext', params)}
+
+    def close(self):
+        self.db.close()
+
+def search_catalog(path, file_extensions, catalog, workers=None):
+    """
+    Refresh the catalog for path and answer from it. Every directory is stat'ed, but only those whose
+    mtime changed since the last run are listed again (and their files stat'ed); unchanged directories
+    descend into their catalogued subdirectories. Returns ({ext: count}, {ext: bytes}).
+    """
+    root = os.path.abspath(path)
+    known = catalog.load_directories(root)
+    listings = {}
+    visited = set()
+
+    def visit(directory, index):
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            return []
+        visited.add(directory)
+        previous = known.get(directory)
+        if previous is not None and previous[0] == mtime_ns:
+            return previous[1]
+        files = []
+
+        def on_file(entry):
+            try:
+                stat = entry.stat()
+            except OSError:
+                return
+            files.append((entry.name, entry.name.split('.')[-1].lower(), stat.st_size, stat.st_mtime_ns))
+        subdirs = list_directory(directory, on_file)
+        # Stat'ed before listing, so a change made during the listing is picked up next run
+        listings[directory] = (mtime_ns, files)
+        return subdirs
+
+    walk_tree(root, visit, workers)
+    catalog.update(root, listings, visited, known)
+    print(f"Catalog: re-listed {len(listings)} of {len(visited)} directories.")
+
+    totals = catalog.totals(root)
+    file_counts = {ext: totals.get(ext.lower(), (0, 0))[0] for ext in file_extensions}
+    file_bytes = {ext: totals.get(ext.lower(), (0, 0))[1] for ext in file_extensions}
+    return file_counts, file_bytes
+
+def format_bytes(size):
+    for unit in ('B', 'KiB', 'MiB', 'GiB', 'TiB'):
+        if size < 1024 or unit == 'TiB':
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{size} B"
+        size /= 1024
+
 def main():
     parser = argparse.ArgumentParser(description="Process media files and count per file type extension.")
     parser.add_argument("-t", "--target", dest="target", required=True, type=lambda x: is_valid_dir(parser, x),
@@ -62,8 +285,17 @@ def main():
     search_by_type.add_argument("-p", "--picture", dest="picture", action='store_true', help="Look for picture files only.")
     search_by_type.add_argument("-d", "--document", dest="document", action='store_true', help="Look for document files only.")
     search_by_type.add_argument("-s", "--sound", dest="sound", action='store_true', help="Look for sound/audio files only.")
-   
+    parser.add_argument("-w", "--workers", dest="workers", type=int, default=default_workers(),
+                        help="Number of directory-listing threads (default: 4 per core, at most 32).")
+    parser.add_argument("-c", "--catalog", dest="catalog",
+                        help="SQLite catalog file; later runs only re-list changed directories and bytes are reported too.")
+
     args = parser.parse_args()
+    # The report below reads the type flags straight from vars(args), so keep only those in it
+    workers = args.workers
+    catalog_file = args.catalog
+    del args.workers
+    del args.catalog
 
     start_time = time.time()
 
@@ -85,9 +317,14 @@ def main():
     else:
         search_extensions = sum([exts for exts in search_types.values()], [])
 
-    with ThreadPoolExecutor() as executor:
-        future = executor.submit(search_files, args.target, search_extensions)
-        counts = future.result()
+    if catalog_file:
+        catalog = FileCatalog(catalog_file)
+        try:
+            counts, sizes = search_catalog(args.target, search_extensions, catalog, workers)
+        finally:
+            catalog.close()
+    else:
+        counts, sizes = search_files(args.target, search_extensions, workers), None
 
     execution_time = time.time() - start_time
     total_files = sum(counts.values())
@@ -95,16 +332,22 @@ def main():
 
     print(f"Searching for {','.join(search_types.keys()) if not any(vars(args).values()) else ', '.join(key for key, value in vars(args).items() if value and key in search_types)} files:\n")
 
-    print("{:<10} {:<10}".format("Extension", "Count"))
+    print("{:<10} {:<10}".format("Extension", "Count") + (" {:>12}".format("Size") if sizes else ""))
     for ext_type, exts in search_types.items():
         if not vars(args)[ext_type] and any(vars(args).values()): 
             continue
         print(f"{'-' * 20} {ext_type.upper()} {'-' * 20}")
         for ext in exts:
             if counts[ext] > 0:
-                print("{:<10} {:<10}".format(ext.upper(), counts[ext]))
+                print("{:<10} {:<10}".format(ext.upper(), counts[ext]) + (" {:>12}".format(format_bytes(sizes[ext])) if sizes else ""))
+        if sizes:
+            unique_exts = set(exts)
+            print("{:<10} {:<10} {:>12}".format("Total", sum(counts[ext] for ext in unique_exts),
+                                               format_bytes(sum(sizes[ext] for ext in unique_exts))))
 
     print("\n{:<10} {:<10}".format("Total Files:", total_files))
+    if sizes:
+        print("{:<10} {}".format("Total Size:", format_bytes(sum(sizes[ext] for ext in set(search_extensions)))))
     print("{:<10} {:.2f} seconds".format("Total Time Spent:", execution_time))
     print("{:<10} {:.2f} files/second".format("Performance Index:", performance_index))
 
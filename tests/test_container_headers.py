@@ -0,0 +1,125 @@
+import math
+import struct
+
+import pytest
+
+from Barcarolle_Container_Headers import CLUSTER, CODEC_ID, DURATION, EBML_HEADER, INFO, PIXEL_HEIGHT, PIXEL_WIDTH, \
+    SEGMENT, TIMECODE_SCALE, TRACK_ENTRY, TRACK_TYPE, TRACKS, VIDEO, read_container_info
+
+
+def box(box_type, payload=b''):
+    return struct.pack('>I4s', 8 + len(payload), box_type.encode('latin-1')) + payload
+
+
+def mvhd(timescale, duration, version=0):
+    if version == 1:
+        return box('mvhd', b'\x01' + bytes(19) + struct.pack('>IQ', timescale, duration) + bytes(80))
+    return box('mvhd', bytes(12) + struct.pack('>II', timescale, duration) + bytes(80))
+
+
+def tkhd(width, height, rotation=0, version=0):
+    # Rotation matrix in 16.16 fixed point (the last column is 2.30), then the 16.16 frame size
+    cos, sin = round(math.cos(math.radians(rotation))), round(math.sin(math.radians(rotation)))
+    matrix = struct.pack('>9i', cos << 16, sin << 16, 0, -sin << 16, cos << 16, 0, 0, 0, 1 << 30)
+    times = bytes(32) if version == 1 else bytes(20)
+    return box('tkhd', bytes([version]) + bytes(3) + times + bytes(16) + matrix + struct.pack('>II', width << 16, height << 16))
+
+
+def trak(handler, width=0, height=0, rotation=0, fourcc=None, version=0):
+    sample_entry = b''
+    if fourcc:
+        entry = struct.pack('>I4s', 86, fourcc.encode('latin-1')) + bytes(6) + struct.pack('>H', 1) + bytes(16) + \
+            struct.pack('>HH', width, height) + bytes(50)
+        sample_entry = box('minf', box('stbl', box('stsd', bytes(4) + struct.pack('>I', 1) + entry)))
+    hdlr = box('hdlr', bytes(8) + handler.encode('latin-1') + bytes(13))
+    return box('trak', tkhd(width, height, rotation, version) + box('mdia', box('mdhd', bytes(24)) + hdlr + sample_entry))
+
+
+def element(element_id, payload=b'', unknown_size=False):
+    # Every size written as an 8-byte EBML integer
+    size = b'\x01\xff\xff\xff\xff\xff\xff\xff' if unknown_size else b'\x01' + len(payload).to_bytes(7, 'big')
+    return element_id.to_bytes((element_id.bit_length() + 7) // 8, 'big') + size + payload
+
+
+def matroska(doc_type, info, tracks, segment_unknown_size=False, tracks_first=False):
+    body = element(TRACKS, tracks) + element(INFO, info) if tracks_first else element(INFO, info) + element(TRACKS, tracks)
+    return element(EBML_HEADER, element(0x4282, doc_type)) + \
+        element(SEGMENT, element(0x114D9B74) + body + element(CLUSTER, bytes(64)), unknown_size=segment_unknown_size)
+
+
+def track_entry(track_type, codec_id, width=None, height=None):
+    video = element(VIDEO, element(PIXEL_WIDTH, width.to_bytes(2, 'big')) +
+                    element(PIXEL_HEIGHT, height.to_bytes(2, 'big'))) if width else b''
+    return element(TRACK_ENTRY, element(TRACK_TYPE, bytes([track_type])) + element(CODEC_ID, codec_id) + video)
+
+
+AUDIO_TRAK = trak('soun', fourcc='mp4a')
+VP9_TRACKS = track_entry(2, b'A_OPUS') + track_entry(1, b'V_VP9', 1280, 720)
+
+VALID_HEADERS = {
+    # Faststart MP4: moov ahead of mdat
+    'faststart.mp4': (box('ftyp', b'isom' + bytes(4)) +
+                      box('moov', mvhd(1000, 12345) + trak('vide', 1920, 1080, 0, 'avc1')) + box('mdat', bytes(256)),
+                      (12.345, 1920, 1080, 0, 'h264')),
+    # Phone footage: mdat first with a 64-bit size, version 1 boxes, the audio track ahead of a rotated video track
+    'phone.mov': (box('ftyp', b'qt  ' + bytes(4)) + struct.pack('>I4sQ', 1, b'mdat', 16 + 512) + bytes(512) +
+                  box('moov', mvhd(600, 600 * 95, version=1) + AUDIO_TRAK + trak('vide', 1920, 1080, 90, 'hvc1', version=1)),
+                  (95.0, 1920, 1080, 90, 'hevc')),
+    # No sample description: size from tkhd, no codec
+    'no_stsd.m4v': (box('moov', mvhd(90000, 90000 * 3) + trak('vide', 720, 1280, 270)),
+                    (3.0, 720, 1280, 270, None)),
+    # A fourcc without a known ffprobe name is passed through
+    'other_codec.mp4': (box('moov', trak('vide', 640, 480, 180, 'xyz1') + mvhd(25, 250)),
+                        (10.0, 640, 480, 180, 'xyz1')),
+    # WebM with an 8-byte float duration in the default millisecond timecode scale, audio track first
+    'vp9.webm': (matroska(b'webm', element(DURATION, struct.pack('>d', 61500.0)), VP9_TRACKS),
+                 (61.5, 1280, 720, 0, 'vp9')),
+    # Live-recorded WebM: a Segment of unknown size and a 4-byte float duration
+    'live.webm': (matroska(b'webm', element(DURATION, struct.pack('>f', 2000.0)), VP9_TRACKS, segment_unknown_size=True),
+                  (2.0, 1280, 720, 0, 'vp9')),
+    # Matroska with Tracks before Info and a custom timecode scale
+    'h264.mkv': (matroska(b'matroska', element(TIMECODE_SCALE, (500000).to_bytes(3, 'big')) +
+                          element(DURATION, struct.pack('>d', 8000.0)),
+                          track_entry(1, b'V_MPEG4/ISO/AVC', 1920, 800), tracks_first=True),
+                 (4.0, 1920, 800, 0, 'h264')),
+}
+
+
+@pytest.mark.parametrize('name', sorted(VALID_HEADERS))
+def test_valid_headers_parse(tmp_path, name):
+    data, (duration, width, height, rotation, codec) = VALID_HEADERS[name]
+    path = tmp_path / name
+    path.write_bytes(data)
+    info = read_container_info(str(path))
+    assert info is not None
+    assert info[0] == pytest.approx(duration)
+    assert info[1:] == (width, height, rotation, codec)
+
+
+TRUNCATED_HEADERS = {
+    # Just the EBML header ID, nothing after it
+    'ebml_id_only.mkv': bytes.fromhex('1A45DFA3'),
+    # EBML header ID and a size byte promising more than the file holds
+    'ebml_short.webm': bytes.fromhex('1A45DFA3 84 4286'),
+    # EBML header followed by a lone Segment ID byte
+    'segment_cut.mkv': bytes.fromhex('1A45DFA3 80 18'),
+    # An mvhd box with an empty payload
+    'empty_mvhd.mp4': box('moov', box('mvhd')),
+    # A version 0 mvhd cut before its timescale/duration
+    'short_mvhd.mp4': box('moov', box('mvhd', bytes(10))),
+    # A version 1 mvhd only long enough for a version 0 one
+    'short_mvhd_v1.mov': box('moov', box('mvhd', b'\x01' + bytes(23))),
+    # A video track whose tkhd stops before the matrix and size
+    'short_tkhd.mp4': box('moov', box('mvhd', bytes(12) + struct.pack('>II', 1000, 5000)) +
+                          box('trak', box('tkhd', bytes(30)) +
+                              box('mdia', box('hdlr', bytes(8) + b'vide' + bytes(12))))),
+    # A moov box claiming more bytes than the file has
+    'overrun.mp4': struct.pack('>I4s', 4096, b'moov') + box('mvhd'),
+}
+
+
+@pytest.mark.parametrize('name', sorted(TRUNCATED_HEADERS))
+def test_truncated_headers_fall_back(tmp_path, name):
+    path = tmp_path / name
+    path.write_bytes(TRUNCATED_HEADERS[name])
+    assert read_container_info(str(path)) is None
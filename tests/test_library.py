@@ -0,0 +1,71 @@
+import argparse
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from Barcarolle_Library import LIBRARY_FILTERS, MIB, MediaLibrary, write_library
+from Barcarolle_Playlist_Generator import MEDIA_FILTERS, MediaInfo, build_filters
+
+# (relative_path, duration, width, height, rotation, size, mtime), with values on every filter's boundaries
+ROWS = [
+    ('landscape_hd.mp4', 60.0, 1280, 720, 0, 10 * MIB, 1700000000.0),
+    ('portrait_fhd.mp4', 30.0, 1080, 1920, 0, 5 * MIB, 1710000000.0),
+    ('rotated_portrait.mov', 120.0, 1920, 1080, 90, 50 * MIB, 1720000000.0),
+    ('rotated_landscape.mp4', 59.5, 1080, 1920, 270, 10 * MIB + 1, 1690000000.0),
+    ('square_sd.webm', 5.0, 480, 480, 0, 1 * MIB, 1704067200.0),
+    ('uhd.mkv', 600.0, 3840, 2160, 0, 900 * MIB, 1730000000.0),
+    ('qhd_wide.mkv', 90.0, 3440, 1440, 180, 200 * MIB, 1725000000.0),
+    ('no_size.mp4', 45.0, None, None, 0, 2 * MIB, 1700000000.0),
+    ('sub/dir/été.mp4', 1.0, 640, 360, 0, 0, 0.0),
+]
+
+OPTIONS = [
+    {},
+    {'min_length': 60},
+    {'max_length': 60},
+    {'min_length': 30, 'max_length': 120},
+    {'portrait': True},
+    {'horz': True},
+    {'min_aspect': 1.0},
+    {'max_aspect': 1.0},
+    {'min_aspect': 1.5, 'max_aspect': 2.0},
+    {'resolution': 'hd'},
+    {'resolution': ['sd', 'uhd']},
+    {'resolution': ['fhd', 'qhd']},
+    {'min_size': 10},
+    {'max_size': 10},
+    {'modified_since': '2024-01-01'},
+    {'modified_since': 1710000000},
+    {'horz': True, 'min_length': 30, 'resolution': ['hd', 'fhd', 'qhd', 'uhd'], 'max_size': 500},
+]
+
+
+@pytest.fixture(scope='module')
+def library(tmp_path_factory):
+    library_dir = tmp_path_factory.mktemp('library') / 'lib'
+    write_library(str(library_dir), '/media', iter(ROWS), 'fingerprint')
+    return MediaLibrary(str(library_dir))
+
+
+def test_library_filters_have_row_twins():
+    assert set(LIBRARY_FILTERS) <= set(MEDIA_FILTERS)
+
+
+def test_library_round_trip(library):
+    assert len(library) == len(ROWS)
+    assert library.root == '/media' and library.fingerprint == 'fingerprint' and library.dedupe is None
+    for index, (relative_path, duration, width, height, rotation, size, mtime) in enumerate(ROWS):
+        assert library.path(index) == relative_path
+        assert library.row(index) == {'duration': duration, 'width': width or 0, 'height': height or 0,
+                                      'rotation': rotation, 'size': size, 'mtime': mtime}
+
+
+@pytest.mark.parametrize('options', OPTIONS, ids=lambda options: ','.join(options) or 'none')
+def test_library_masks_match_media_filters(library, options):
+    args = argparse.Namespace(**options)
+    predicates = build_filters(args)
+    expected = [index for index, (_, duration, width, height, rotation, size, mtime) in enumerate(ROWS)
+                if all(predicate(MediaInfo(duration, width, height, rotation, 'h264', True, size, mtime))
+                       for predicate in predicates)]
+    assert list(library.select(args)) == expected
@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+import Barcarolle_Playlist_Generator as barcarolle
+from Barcarolle_Playlist_Generator import MediaInfo
+from Manato_Cascading_Folder_Playlist_Generator import load_manifest, process_subdirectory, save_manifest_entry, \
+    snapshot_tree
+
+
+def write(path, data=b'video'):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / 'lib'
+    write(root / 'a.mp4')
+    write(root / 'sub' / 'b.mkv')
+    write(root / 'notes.txt')
+    return root
+
+
+def test_manifest_round_trip(tmp_path):
+    manifest_dir = str(tmp_path / '.manato_manifest')
+    states = {'/media/a': {'entries': 2, 'files': {'x.mp4': [1, 2, True]}},
+              '/media/b é': {'entries': 0, 'files': {}}}
+    for key, state in states.items():
+        save_manifest_entry(manifest_dir, key, state)
+    save_manifest_entry(manifest_dir, '/media/a', {'entries': 3, 'files': {}})
+    write(tmp_path / '.manato_manifest' / 'broken.json', b'{')
+    write(tmp_path / '.manato_manifest' / 'notes.txt', b'{}')
+    assert load_manifest(manifest_dir) == {'/media/a': {'entries': 3, 'files': {}}, '/media/b é': states['/media/b é']}
+
+
+def test_missing_manifest_is_empty(tmp_path):
+    assert load_manifest(str(tmp_path / 'missing')) == {}
+
+
+def test_snapshot_lists_videos_in_walk_order(tree):
+    fingerprint, files, listing = snapshot_tree(str(tree))
+    assert list(files) == ['a.mp4', 'sub/b.mkv']
+    assert [(os.path.relpath(directory, tree), names) for directory, names in listing] == \
+        [('.', ['a.mp4', 'notes.txt']), ('sub', ['b.mkv'])]
+    assert snapshot_tree(str(tree))[0] == fingerprint
+
+
+def add(root):
+    write(root / 'sub' / 'c.mp4')
+
+
+def modify(root):
+    stat = os.stat(root / 'a.mp4')
+    os.utime(root / 'a.mp4', ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+
+
+def resize(root):
+    # Same mtime, different size
+    stat = os.stat(root / 'a.mp4')
+    write(root / 'a.mp4', b'longer video')
+    os.utime(root / 'a.mp4', ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+
+def rename(root):
+    os.rename(root / 'sub' / 'b.mkv', root / 'sub' / 'c.mkv')
+
+
+def remove(root):
+    os.remove(root / 'a.mp4')
+
+
+@pytest.mark.parametrize('change', [add, modify, resize, rename, remove])
+def test_snapshot_fingerprint_detects_changes(tree, change):
+    fingerprint = snapshot_tree(str(tree))[0]
+    change(tree)
+    assert snapshot_tree(str(tree))[0] != fingerprint
+
+
+def test_incremental_run_probes_only_changed_files(tmp_path, tree, monkeypatch):
+    probed = []
+
+    def probe(full_path, timeout=None):
+        probed.append(os.path.relpath(full_path, tree))
+        return MediaInfo(60.0, 1920, 1080, 0, 'h264', has_video=True)
+
+    monkeypatch.setattr(barcarolle, 'run_lean_probe', probe)
+    config = {'output_dir': str(tmp_path / 'out'), 'os_types': ['linux'], 'os_mounts': ['/mnt'], 'zip_output': 'no',
+              'header_probe': 'no', 'cache_mode': 'off', 'jobs': 1}
+    manifest_dir = str(tmp_path / 'out' / '.manato_manifest')
+
+    state, archive = process_subdirectory(config, str(tree), 'lib', incremental=True)
+    assert sorted(probed) == ['a.mp4', os.path.join('sub', 'b.mkv')]
+    assert state['entries'] == 2 and archive is None
+
+    # The state survives the manifest and an unchanged tree is skipped without probing
+    save_manifest_entry(manifest_dir, str(tree), state)
+    previous = load_manifest(manifest_dir)[str(tree)]
+    probed.clear()
+    assert process_subdirectory(config, str(tree), 'lib', previous, incremental=True) == (previous, None)
+    assert probed == []
+
+    add(tree)
+    state, _ = process_subdirectory(config, str(tree), 'lib', previous, incremental=True)
+    assert probed == [os.path.join('sub', 'c.mp4')]
+    assert state['entries'] == 3 and state['output_folder'] == previous['output_folder']
+    playlist = os.path.join(state['output_folder'], 'lib-linux.m3u8')
+    with open(playlist) as f:
+        assert [line for line in f.read().splitlines() if not line.startswith('#')] == \
+            ['/mnt/a.mp4', '/mnt/sub/b.mkv', '/mnt/sub/c.mp4']
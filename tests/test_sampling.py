@@ -0,0 +1,89 @@
+import argparse
+import random
+from collections import Counter
+
+import pytest
+
+from Barcarolle_Playlist_Generator import duration_sample, reservoir_sample, select_entries
+
+
+def test_reservoir_keeps_everything_when_k_covers_the_input():
+    assert reservoir_sample(range(5), 5) == [0, 1, 2, 3, 4]
+    assert reservoir_sample(range(5), 50) == [0, 1, 2, 3, 4]
+    assert reservoir_sample(range(5), 0) == []
+    assert reservoir_sample([], 3) == []
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_reservoir_picks_k_distinct_items_in_input_order(seed):
+    picked = reservoir_sample(iter(range(1000)), 25, random.Random(seed))
+    assert len(picked) == 25
+    assert picked == sorted(set(picked))
+
+
+def test_reservoir_shuffles_when_order_is_not_kept():
+    picked = reservoir_sample(range(1000), 50, random.Random(1), keep_order=False)
+    assert len(set(picked)) == 50
+    assert picked != sorted(picked)
+
+
+def test_reservoir_is_uniform():
+    rng = random.Random(7)
+    trials = 20000
+    counts = Counter(item for _ in range(trials) for item in reservoir_sample(range(10), 3, rng))
+    # Each item should be picked in 3/10 of the trials
+    for item in range(10):
+        assert abs(counts[item] / trials - 0.3) < 0.02
+
+
+def shuffled_prefix(items, budget, seed):
+    # What duration_sample promises: shuffle everything, then fill the budget from the front
+    rng = random.Random(seed)
+    keys = [rng.random() for _ in items]
+    picked, total = [], 0.0
+    for index in sorted(range(len(items)), key=keys.__getitem__):
+        if total >= budget:
+            break
+        picked.append(items[index])
+        total += items[index][1]
+    return picked
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('budget', [1, 300, 1000, 5000])
+def test_duration_sample_matches_shuffle_then_fill(seed, budget):
+    durations = random.Random(seed + 100)
+    items = [(f"clip{index}.mp4", durations.uniform(5, 120)) for index in range(60)]
+    expected = shuffled_prefix(items, budget, seed)
+    assert duration_sample(iter(items), budget, random.Random(seed), keep_order=False) == expected
+    assert duration_sample(iter(items), budget, random.Random(seed)) == sorted(expected, key=items.index)
+
+
+def test_duration_sample_keeps_everything_under_budget():
+    items = [('a.mp4', 10.0), ('b.mp4', 20.0)]
+    assert duration_sample(items, 1000, random.Random(0)) == items
+
+
+ENTRIES = [(f"/mnt/clip{index}.mp4", 60.0) for index in range(100)]
+
+
+@pytest.mark.parametrize('shuffle', ['yes', 'no'])
+def test_select_entries_passes_everything_through_without_sample_or_budget(shuffle):
+    entries, still_shuffle = select_entries(argparse.Namespace(shuffle=shuffle), iter(ENTRIES))
+    assert list(entries) == [entry for entry, _ in ENTRIES]
+    assert still_shuffle == (shuffle == 'yes')
+
+
+@pytest.mark.parametrize('shuffle', ['yes', 'no'])
+def test_select_entries_sample(shuffle):
+    args = argparse.Namespace(shuffle=shuffle, sample=10, budget=None)
+    entries, still_shuffle = select_entries(args, iter(ENTRIES), random.Random(3))
+    entries = list(entries)
+    assert len(entries) == 10 and not still_shuffle
+    assert (entries == sorted(entries, key=[entry for entry, _ in ENTRIES].index)) == (shuffle == 'no')
+
+
+def test_select_entries_budget():
+    args = argparse.Namespace(sample=None, budget=600)
+    entries, still_shuffle = select_entries(args, iter(ENTRIES), random.Random(3))
+    assert len(list(entries)) == 10 and not still_shuffle